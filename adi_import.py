@@ -1,175 +1,190 @@
 import os
-import re
-import psycopg2
-from datetime import datetime, timedelta
+import sys
+import threading
+from queue import Empty, Queue
 from tkinter import filedialog, messagebox, Toplevel, Label, StringVar
-from tkinter.ttk import Progressbar
-from config import DB_SETTINGS
-
-ADIF_FILE_TABLE = "imported_adif_files"
-
-# Normalize callsign (e.g. OH0/OH3AA/M -> OH3AA)
-def normalize_callsign(call):
-    match = re.search(r"([A-Z0-9]+)$", call.replace("/", ""))
-    return match.group(1) if match else call
-
-def connect_db():
-    return psycopg2.connect(**DB_SETTINGS)
-
-def create_tables():
-    with connect_db() as conn:
-        with conn.cursor() as cur:
-            cur.execute(f'''
-                CREATE TABLE IF NOT EXISTS {ADIF_FILE_TABLE} (
-                    filename TEXT PRIMARY KEY,
-                    imported_at TIMESTAMP NOT NULL
-                );
-            ''')
-            conn.commit()
-
-def parse_adif_line(line):
-    fields = {}
-    matches = re.findall(r"<(\w+)(?::\d+)(?::\w+)?>((?:(?!<\w+:).)*)", line)
-    for key, value in matches:
-        fields[key.upper()] = value.strip()
-    return fields
-
-def get_or_create_callsign(callsign_str, qso_date):
-    callsign_str = normalize_callsign(callsign_str)
-    with connect_db() as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT id, firstseen, lastseen FROM callsigns WHERE callsign = %s", (callsign_str,))
-            row = cur.fetchone()
-            if row:
-                id_, firstseen, lastseen = row
-                if not firstseen or qso_date < firstseen:
-                    firstseen = qso_date
-                if not lastseen or qso_date > lastseen:
-                    lastseen = qso_date
-                cur.execute("UPDATE callsigns SET firstseen = %s, lastseen = %s WHERE id = %s", (firstseen, lastseen, id_))
-                conn.commit()
-                return id_
-            else:
-                cur.execute("INSERT INTO callsigns (callsign, firstseen, lastseen) VALUES (%s, %s, %s) RETURNING id",
-                            (callsign_str, qso_date, qso_date))
-                id_ = cur.fetchone()[0]
-                conn.commit()
-                return id_
-
-def create_progress_window(root, total):
+from tkinter.ttk import Button, Progressbar
+from adif_batch import find_adif_files, start_batch_import
+from callsign_index import callsigns_changed
+from qso_import import connect_db, create_tables, import_file, plan_file_import
+
+# How often the progress window drains the worker's event queue
+PROGRESS_POLL_MS = 100
+
+COUNT_LABELS = {
+    "records": "Records read", "imported": "Imported", "updated": "Updated",
+    "ignored": "Ignored", "rejected": "Rejected",
+}
+# A bulk import only knows how many records were imported, updated or ignored at the end
+BULK_COUNTS = ("records", "rejected")
+BATCH_COUNTS = ("imported", "updated", "ignored", "rejected")
+
+def create_progress_window(root, total, text="Importing ADIF file...", cancel_command=None, counts=BATCH_COUNTS):
+    """Return (window, progress bar, {count key: StringVar}) showing *counts*."""
     win = Toplevel(root)
     win.title("Import Progress")
-    Label(win, text="Importing ADIF file...").pack(padx=10, pady=5)
-
-    imported = StringVar(value="Imported: 0")
-    updated = StringVar(value="Updated: 0")
-    ignored = StringVar(value="Ignored: 0")
+    Label(win, text=text).pack(padx=10, pady=5)
 
-    Label(win, textvariable=imported).pack()
-    Label(win, textvariable=updated).pack()
-    Label(win, textvariable=ignored).pack()
+    count_vars = {}
+    for key in counts:
+        count_vars[key] = StringVar(value=f"{COUNT_LABELS[key]}: 0")
+        Label(win, textvariable=count_vars[key]).pack()
 
     progress = Progressbar(win, length=300, maximum=total)
     progress.pack(padx=10, pady=10)
 
-    return win, progress, imported, updated, ignored
+    if cancel_command:
+        Button(win, text="Cancel", command=cancel_command).pack(pady=(0, 10))
+        win.protocol("WM_DELETE_WINDOW", cancel_command)
 
-def import_adi_file(file_path, root=None):
-    create_tables()
+    return win, progress, count_vars
+
+def show_counts(count_vars, stats):
+    for key, var in count_vars.items():
+        var.set(f"{COUNT_LABELS[key]}: {stats[key]}")
+
+def show_import_result(stats, filename, offset):
+    if stats["records"] == 0:
+        if offset:
+            messagebox.showinfo("Nothing to Import", f"No new records in {filename} since the last import.")
+        else:
+            messagebox.showerror("Invalid File", "No valid ADIF records found.")
+        return
+    title = "Import Cancelled" if stats["cancelled"] else "Import Complete"
+    message = f"QSOs imported: {stats['imported']}\nUpdated: {stats['updated']}\nIgnored: {stats['ignored']}"
+    if stats["rejected"]:
+        message += f"\n\n{stats['rejected']} rejected records were written to\n{stats['rejects_file']}"
+    messagebox.showinfo(title, message)
+
+# ---------- Import ----------
+def import_adi_file(file_path, root=None, bulk=False):
+    """Import the QSOs of an ADIF file into qsos.
+
+    A file that only grew since its last import (e.g. a WSJT-X log) is read from
+    the end of the last imported record; a truncated or replaced file is
+    imported in full. With *bulk* the records are COPYed into a staging table
+    and deduplicated with set-based SQL instead of one SELECT and INSERT per record.
+
+    Without *root* the import runs here and its counts are returned. With a Tk
+    *root* it runs in a worker thread that posts progress on a queue; a
+    progress window polls the queue and can cancel the import.
+    """
+    migration_error = create_tables()
     filename = os.path.basename(file_path)
+    if migration_error is not None:
+        if not root:
+            print(f"Schema migration failed, importing anyway: {migration_error}", file=sys.stderr)
+        elif not messagebox.askyesno("Schema Migration Failed",
+                                     f"Updating the database schema failed:\n{migration_error}\n\n"
+                                     "Import anyway? It works, but may be slower."):
+            return
 
     with connect_db() as conn:
-        with conn.cursor() as cur:
-            cur.execute(f"SELECT imported_at FROM {ADIF_FILE_TABLE} WHERE filename = %s", (filename,))
-            row = cur.fetchone()
-            if row:
-                last_time = row[0].strftime("%Y-%m-%d %H:%M")
-                if not messagebox.askyesno("File Already Imported", f"The file {filename} was already imported at {last_time}. Import again?"):
-                    return
-
-    with open(file_path, "r", encoding="utf-8") as f:
-        lines = [line.strip() for line in f if line.strip().startswith("<") and "<EOR>" in line.upper()]
-
-    if not lines:
-        messagebox.showerror("Invalid File", "No valid ADIF records found.")
+        status, offset, imported_at = plan_file_import(conn, file_path)
+    if status == "current":
+        last_time = imported_at.strftime("%Y-%m-%d %H:%M")
+        if not messagebox.askyesno("File Already Imported", f"The file {filename} was already imported at {last_time}. Import again?"):
+            return
+        offset = 0
+
+    if not root:
+        return import_file(file_path, offset, bulk)
+
+    events = Queue()
+    cancel = threading.Event()
+
+    def work():
+        try:
+            events.put(("done", import_file(file_path, offset, bulk, lambda stats: events.put(("progress", stats)), cancel)))
+        except Exception as e:
+            events.put(("error", e))
+
+    win, bar, count_vars = create_progress_window(
+        root, os.path.getsize(file_path), cancel_command=cancel.set, counts=BULK_COUNTS if bulk else BATCH_COUNTS)
+    bar["value"] = offset
+    threading.Thread(target=work, daemon=True).start()
+
+    def poll():
+        # Only the newest progress event is drawn, however many arrived since the last poll
+        stats = None
+        try:
+            while True:
+                kind, payload = events.get_nowait()
+                if kind == "progress":
+                    stats = payload
+                    continue
+                win.destroy()
+                # even a failed import may have committed new callsigns
+                callsigns_changed()
+                if kind == "error":
+                    messagebox.showerror("Import Failed", f"Error importing {filename}:\n{payload}")
+                else:
+                    show_import_result(payload, filename, offset)
+                return
+        except Empty:
+            pass
+
+        if stats:
+            bar["value"] = stats["position"]
+            show_counts(count_vars, stats)
+        win.after(PROGRESS_POLL_MS, poll)
+
+    poll()
+
+def choose_and_import_adi_file(root):
+    file_path = filedialog.askopenfilename(
+        title="Select ADIF file", filetypes=[("ADIF files", "*.adi *.adif"), ("All files", "*.*")])
+    if file_path:
+        import_adi_file(file_path, root, bulk=True)
+
+def import_adif_folder(root, folder=None):
+    """Import every ADIF file of a folder in the background, showing aggregate progress."""
+    folder = folder or filedialog.askdirectory(title="Select folder with ADIF files")
+    if not folder:
         return
 
-    win, bar, imported_var, updated_var, ignored_var = (None, None, None, None, None)
-    if root:
-        win, bar, imported_var, updated_var, ignored_var = create_progress_window(root, len(lines))
-
-    imported = updated = ignored = 0
+    paths = find_adif_files(folder)
+    if not paths:
+        messagebox.showerror("Invalid Folder", "No .adi/.adif files found.")
+        return
 
-    with connect_db() as conn:
-        for i, line in enumerate(lines):
-            fields = parse_adif_line(line)
-            try:
-                freq = float(fields.get("FREQ", 0))
-                brg = int(fields.get("APP_PSKREP_BRG", 0))
-                distance = float(fields.get("DISTANCE", 0))
-                mode = fields.get("MODE", "").upper() or "UNKNOWN"
-                operator = fields.get("OPERATOR", "")
-                raw_operator = operator
-                call = fields.get("CALL", "")
-                raw_call = call
-                my_grid = fields.get("MY_GRIDSQUARE", "")
-                qso_date = datetime.strptime(fields.get("QSO_DATE", "19700101"), "%Y%m%d").date()
-                time_on = datetime.strptime(fields.get("TIME_ON", "000000"), "%H%M%S").time()
-                snr = int(fields.get("APP_PSKREP_SNR", 0))
-                country = fields.get("COUNTRY", "")
-                dxcc = int(fields.get("DXCC", 0))
-                grid = fields.get("GRIDSQUARE", "")
-                qso_complete = fields.get("QSO_COMPLETE", "1")
-                swl = fields.get("SWL", "0") in ("1", "Y", "y", "true", "True")
-
-                operator_id = get_or_create_callsign(operator, qso_date) if operator else None
-                call_id = get_or_create_callsign(call, qso_date) if call else None
-
-                with conn.cursor() as cur:
-                    # Check for duplicates
-                    cur.execute("""
-                        SELECT id, qso_complete FROM qsos
-                        WHERE operator_id = %s AND call_id = %s AND freq = %s
-                        AND qso_date = %s AND ABS(EXTRACT(EPOCH FROM (time_on - %s))) <= 180
-                    """, (operator_id, call_id, freq, qso_date, time_on))
-                    dup = cur.fetchone()
-                    if dup:
-                        if qso_complete > (dup[1] or ''):
-                            cur.execute("""
-                                UPDATE qsos SET qso_complete = %s WHERE id = %s
-                            """, (qso_complete, dup[0]))
-                            updated += 1
-                        else:
-                            ignored += 1
-                        continue
-
-                    cur.execute("""
-                        INSERT INTO qsos (freq, app_pskrep_brg, distance, mode, operator_id, call_id,
-                            my_gridsquare, qso_date, time_on, app_pskrep_snr, raw_operator, raw_call,
-                            country, dxcc, gridsquare, qso_complete, swl)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (freq, brg, distance, mode, operator_id, call_id, my_grid, qso_date, time_on,
-                          snr, raw_operator, raw_call, country, dxcc, grid, qso_complete, swl))
-                    imported += 1
-
-            except Exception as e:
-                ignored += 1
-
-            if win:
-                bar["value"] = i + 1
-                imported_var.set(f"Imported: {imported}")
-                updated_var.set(f"Updated: {updated}")
-                ignored_var.set(f"Ignored: {ignored}")
-                win.update()
-
-        with conn.cursor() as cur:
-            cur.execute(f"""
-                INSERT INTO {ADIF_FILE_TABLE} (filename, imported_at)
-                VALUES (%s, now())
-                ON CONFLICT (filename) DO UPDATE SET imported_at = EXCLUDED.imported_at
-            """, (filename,))
-            conn.commit()
-
-    if win:
-        messagebox.showinfo("Import Complete", f"QSOs imported: {imported}\nUpdated: {updated}\nIgnored: {ignored}")
-        win.destroy()
+    process, progress_queue = start_batch_import(paths)
+    win, bar, count_vars = create_progress_window(
+        root, len(paths), f"Importing {len(paths)} ADIF files...")
+    file_var = StringVar()
+    Label(win, textvariable=file_var).pack(pady=(0, 10))
+
+    def poll():
+        totals = None
+        try:
+            while True:
+                totals = progress_queue.get_nowait()
+        except Empty:
+            pass
+
+        if totals:
+            bar["value"] = totals["files_done"] + totals["files_skipped"]
+            show_counts(count_vars, totals)
+            file_var.set(totals["file"])
+            if totals["finished"]:
+                process.join()
+                win.destroy()
+                callsigns_changed()
+                message = (f"Files imported: {totals['files_done'] - len(totals['errors'])}\n"
+                           f"Already imported: {totals['files_skipped']}\n"
+                           f"QSOs imported: {totals['imported']}\nUpdated: {totals['updated']}\n"
+                           f"Ignored: {totals['ignored']}\nRejected: {totals['rejected']}")
+                if totals["errors"]:
+                    messagebox.showwarning("Import Complete", message + "\n\nFailed:\n" + "\n".join(totals["errors"]))
+                else:
+                    messagebox.showinfo("Import Complete", message)
+                return
+
+        if not process.is_alive() and progress_queue.empty():
+            win.destroy()
+            callsigns_changed()
+            messagebox.showerror("Import Failed", f"The import process stopped unexpectedly (exit code {process.exitcode}).")
+            return
+        win.after(PROGRESS_POLL_MS, poll)
+
+    poll()
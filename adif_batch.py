@@ -0,0 +1,142 @@
+"""Batch import of many ADIF files, e.g. a folder of per-day or per-band logs.
+
+Files are read and converted in a process pool. The process running
+run_batch_import() is the single database writer: it loads each parsed file
+with the COPY-based bulk path and records it in imported_adif_files.
+start_batch_import() runs that writer in its own process so the Tk loop stays
+free, and reports aggregate progress through a multiprocessing queue. Files
+that grew since their last import are read from where that import stopped.
+"""
+
+import glob
+import os
+import sys
+from multiprocessing import Pool, Process, Queue
+import psycopg2
+from qso_import import (
+    RESOLVE_BATCH_SIZE, CallsignResolver, bulk_load_qsos, connect_db, create_tables, import_file,
+    mark_file_imported, parse_qsos, plan_file_import, write_rejects,
+)
+
+ADIF_EXTENSIONS = (".adi", ".adif")
+
+
+def find_adif_files(path):
+    """Return the ADIF files in directory *path*, or matching glob pattern *path*, sorted."""
+    if os.path.isdir(path):
+        paths = [os.path.join(path, name) for name in os.listdir(path) if name.lower().endswith(ADIF_EXTENSIONS)]
+    else:
+        paths = glob.glob(path)
+    return sorted(p for p in paths if os.path.isfile(p))
+
+
+def parse_file(job):
+    """Pool worker: parse one (file_path, offset) job.
+
+    Returns (file_path, parse_qsos() result, None), or (file_path, None, error)
+    when the file cannot be read, so that one bad file does not end the batch.
+    """
+    file_path, offset = job
+    try:
+        return file_path, parse_qsos(file_path, offset), None
+    except Exception as e:
+        return file_path, None, str(e) or type(e).__name__
+
+
+def run_batch_import(paths, progress_queue=None, workers=None, reimport=False):
+    """Import every file in *paths* and return the aggregate counts.
+
+    Files already in imported_adif_files are skipped, or only their appended
+    records imported, unless *reimport* is set.
+    Each file is committed on its own. A file the COPY load fails for is rolled
+    back and imported again in batches with import_file(), which rejects just
+    the rows the database refuses; a file that cannot be read or fails
+    otherwise is listed in "errors" and the batch continues. Records that cannot be
+    converted go to the file's .rejects.adi sidecar. After every file a copy of the
+    counts is put on *progress_queue*, the last one with "finished" set.
+    """
+    totals = {
+        "files_total": len(paths), "files_done": 0, "files_skipped": 0,
+        "imported": 0, "updated": 0, "ignored": 0, "rejected": 0,
+        "file": "", "errors": [], "finished": False,
+    }
+
+    def report():
+        if progress_queue is not None:
+            progress_queue.put(dict(totals, errors=list(totals["errors"])))
+
+    migration_error = create_tables()
+    if migration_error is not None:
+        print(f"Schema migration failed, importing anyway: {migration_error}", file=sys.stderr)
+    with connect_db() as conn:
+        pending = [(p, 0) for p in paths]
+        if not reimport:
+            pending = []
+            failed = 0
+            for path in paths:
+                try:
+                    status, offset, _ = plan_file_import(conn, path)
+                except OSError as e:
+                    # e.g. deleted since the folder was listed
+                    totals["errors"].append(f"{os.path.basename(path)}: {e}")
+                    failed += 1
+                    continue
+                if status != "current":
+                    pending.append((path, offset))
+            totals["files_done"] = failed
+            totals["files_skipped"] = len(paths) - len(pending) - failed
+            report()
+        offsets = dict(pending)
+
+        resolver = CallsignResolver(conn)
+        with Pool(workers) as pool:
+            for file_path, parsed, error in pool.imap_unordered(parse_file, pending):
+                filename = os.path.basename(file_path)
+                if error is not None:
+                    totals["errors"].append(f"{filename}: {error}")
+                else:
+                    qsos, rejects, end_offset, stat = parsed
+                    try:
+                        for start in range(0, len(qsos), RESOLVE_BATCH_SIZE):
+                            resolver.resolve(qsos[start:start + RESOLVE_BATCH_SIZE])
+                        imported, updated, duplicates = bulk_load_qsos(conn, qsos)
+                        resolver.flush()
+                        mark_file_imported(conn, file_path, end_offset, stat)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        # callsigns inserted by the failed transaction are gone again
+                        resolver = CallsignResolver(conn)
+                        if not isinstance(e, (psycopg2.Error, ValueError)):
+                            totals["errors"].append(f"{filename}: {e}")
+                        else:
+                            # a row the database refuses fails the whole COPY; import the
+                            # file again in batches, which leaves out just the refused rows
+                            try:
+                                stats = import_file(file_path, offsets[file_path])
+                            except Exception as e:
+                                totals["errors"].append(f"{filename}: {e}")
+                            else:
+                                for key in ("imported", "updated", "ignored", "rejected"):
+                                    totals[key] += stats[key]
+                    else:
+                        totals["imported"] += imported
+                        totals["updated"] += updated
+                        totals["ignored"] += duplicates
+                        totals["rejected"] += len(rejects)
+                        write_rejects(file_path, rejects, append=offsets[file_path] > 0)
+                totals["files_done"] += 1
+                totals["file"] = filename
+                report()
+
+    totals["finished"] = True
+    report()
+    return totals
+
+
+def start_batch_import(paths, workers=None, reimport=False):
+    """Run run_batch_import() in a writer process; returns (process, progress_queue)."""
+    progress_queue = Queue()
+    process = Process(target=run_batch_import, args=(list(paths), progress_queue, workers, reimport))
+    process.start()
+    return process, progress_queue
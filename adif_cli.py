@@ -0,0 +1,100 @@
+"""Command-line ADIF importer, for cron jobs and measurements.
+
+    python -m adif_cli [--no-copy] [--force] [--json] FILE [FILE ...]
+
+Uses the same engine as the GUI import (qso_import) without any Tk
+dependency. Files already imported are skipped unless --force is given, and
+files that grew since their last import only have the new records imported.
+For every file it prints records/second, the time spent parsing vs. in the
+database, and the imported/updated/ignored/rejected counts; --json prints the same as
+one JSON document for monitoring.
+"""
+
+import argparse
+import json
+import os
+import sys
+from qso_import import create_tables, connect_db, import_file, plan_file_import
+
+COUNT_KEYS = ("records", "imported", "updated", "ignored", "rejected")
+TIME_KEYS = ("seconds", "parse_seconds", "db_seconds")
+
+
+def records_per_second(stats):
+    return stats["records"] / stats["seconds"] if stats["seconds"] else 0.0
+
+
+def import_paths(paths, bulk=True, force=False):
+    """Import *paths* one after another; returns a list of per-file result dicts."""
+    migration_error = create_tables()
+    if migration_error is not None:
+        # files still import, only without the indexes and tables of the migrations
+        print(f"Schema migration failed, importing anyway: {migration_error}", file=sys.stderr)
+    results = []
+    for path in paths:
+        result = {"file": path, "status": "", "error": None}
+        try:
+            with connect_db() as conn:
+                status, offset, _ = plan_file_import(conn, path)
+            result["status"] = status
+            if status == "current" and not force:
+                result["status"] = "skipped"
+            else:
+                if status == "current":
+                    offset = 0
+                stats = import_file(path, offset, bulk)
+                result.update(stats)
+                result["records_per_second"] = records_per_second(stats)
+        except Exception as e:
+            result["error"] = str(e)
+        results.append(result)
+    return results
+
+
+def summarize(results):
+    totals = {key: sum(r.get(key, 0) for r in results) for key in COUNT_KEYS + TIME_KEYS}
+    totals["records_per_second"] = records_per_second(totals)
+    totals["errors"] = sum(1 for r in results if r["error"])
+    return totals
+
+
+def print_text(results, totals):
+    for r in results:
+        name = os.path.basename(r["file"])
+        if r["error"]:
+            print(f"{name}: FAILED: {r['error']}")
+        elif r["status"] == "skipped":
+            print(f"{name}: already imported, skipped (use --force to import again)")
+        else:
+            print(f"{name}: {r['records']} records in {r['seconds']:.2f} s "
+                  f"({r['records_per_second']:.0f} rec/s; parse {r['parse_seconds']:.2f} s, "
+                  f"db {r['db_seconds']:.2f} s)")
+            print(f"  imported {r['imported']}, updated {r['updated']}, ignored {r['ignored']}")
+            if r["rejected"]:
+                print(f"  {r['rejected']} rejected, see {r['rejects_file']}")
+    if len(results) > 1:
+        print(f"total: {totals['records']} records in {totals['seconds']:.2f} s "
+              f"({totals['records_per_second']:.0f} rec/s); imported {totals['imported']}, "
+              f"updated {totals['updated']}, ignored {totals['ignored']}, rejected {totals['rejected']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m adif_cli", description="Import ADIF files into HamData.")
+    parser.add_argument("files", nargs="+", help="ADIF files to import")
+    parser.add_argument("--no-copy", action="store_true",
+                        help="deduplicate in memory and insert in batches instead of the COPY bulk path")
+    parser.add_argument("--force", action="store_true", help="import files again that were already imported")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = import_paths(args.files, bulk=not args.no_copy, force=args.force)
+    totals = summarize(results)
+    if args.json:
+        print(json.dumps({"files": results, "totals": totals}, indent=2))
+    else:
+        print_text(results, totals)
+    return 1 if totals["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
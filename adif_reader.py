@@ -0,0 +1,107 @@
+"""Streaming ADIF reader.
+
+Reads an ADIF (.adi) file in fixed-size chunks and yields one record at a time,
+so memory use does not grow with the size of the log. Field values are taken
+by their declared length (<CALL:5>OH3AA), which lets records span lines and
+values contain '<'. Tag names are case-insensitive and returned upper-case.
+Everything up to <EOH> is header and is skipped.
+
+The file is read in binary mode and lengths are counted in bytes, as written
+by WSJT-X, JTDX and most loggers; values are decoded as UTF-8. Reading can
+start at any record boundary (see with_offsets), which is how growing logs
+are imported incrementally. format_adif_record() writes records back out.
+"""
+
+CHUNK_SIZE = 1 << 16
+MAX_CACHED_TAGS = 1024
+
+
+def read_adif(f, chunk_size=CHUNK_SIZE, with_offsets=False):
+    """Yield a {FIELD: value} dict for every <EOR>-terminated record in binary file *f*.
+
+    Reading starts at the current position of *f*. With *with_offsets* the
+    generator yields (record, offset) pairs instead, offset being the file
+    position just after the record's <EOR>.
+    """
+    buf = b""
+    base = f.tell()  # file position of buf[0]
+    pos = 0
+    eof = False
+    record = {}
+    tags = {}  # raw tag bytes -> (NAME, length or None); files use a handful of distinct tags
+
+    while True:
+        start = buf.find(b"<", pos)
+        end = buf.find(b">", start) if start >= 0 else -1
+        if end < 0:
+            if eof:
+                break
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            # keep a tag that was cut in half by the chunk boundary
+            keep = start if start >= 0 else len(buf)
+            base += keep
+            buf = buf[keep:] + chunk
+            pos = 0
+            continue
+
+        tag = buf[start + 1:end]
+        spec = tags.get(tag)
+        if spec is None:
+            spec = parse_tag(tag)
+            if len(tags) < MAX_CACHED_TAGS:
+                tags[tag] = spec
+        name, length = spec
+
+        if length is None:
+            if name == "EOR":
+                if record:
+                    yield (record, base + end + 1) if with_offsets else record
+                record = {}
+            elif name == "EOH":
+                record = {}
+            pos = end + 1
+            continue
+        if length < 0:
+            # not a tag after all, e.g. a stray '<' in the header text
+            pos = start + 1
+            continue
+
+        value_start = end + 1
+        value_end = value_start + length
+        while len(buf) < value_end and not eof:
+            chunk = f.read(max(chunk_size, value_end - len(buf)))
+            eof = not chunk
+            buf += chunk
+        record[name] = buf[value_start:value_end].decode("utf-8", "replace").strip()
+        pos = value_end
+
+
+def parse_tag(tag):
+    """Split the inside of a tag, b"call:5" or b"EOR", into ("CALL", 5) / ("EOR", None).
+
+    The length is -1 when the tag has a length part that is not a number.
+    """
+    name, _, spec = tag.partition(b":")
+    name = name.strip().upper().decode("ascii", "replace")
+    if not spec:
+        return name, None
+    try:
+        return name, int(spec.partition(b":")[0])
+    except ValueError:
+        return name, -1
+
+
+def read_adif_file(file_path, chunk_size=CHUNK_SIZE):
+    """Yield the records of the ADIF file at *file_path*."""
+    with open(file_path, "rb") as f:
+        yield from read_adif(f, chunk_size)
+
+
+def format_adif_record(fields):
+    """Return *fields* as one <EOR>-terminated ADIF record in bytes."""
+    parts = []
+    for name, value in fields.items():
+        data = str(value).encode("utf-8")
+        parts.append(b"<%s:%d>%s " % (name.encode("ascii", "replace"), len(data), data))
+    return b"".join(parts) + b"<EOR>\n"
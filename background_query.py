@@ -0,0 +1,155 @@
+"""Debounced database queries for Tk windows, run on a worker thread.
+
+A window calls BackgroundQuery.run(work, on_done) whenever its filters change.
+The query starts once the filters have been left alone for *delay*
+milliseconds; work(conn) then runs on a worker thread with its own pooled
+connection. Starting a query cancels the one still running on the server
+(connection.cancel()), and only the newest query's result reaches on_done,
+which is called on the Tk thread. stream() does the same for a query whose
+rows are handed to the window in chunks as they arrive.
+"""
+
+import threading
+from queue import Empty, Queue
+import tkinter as tk
+from config import get_pg_connection
+
+# Milliseconds a filter change waits for further typing before the query starts
+FILTER_DELAY_MS = 200
+# Milliseconds between checks for finished queries
+RESULT_POLL_MS = 30
+
+# SQLSTATE of a statement cancelled by connection.cancel()
+QUERY_CANCELED = "57014"
+
+
+class BackgroundQuery:
+    def __init__(self, widget):
+        self.widget = widget
+        self.generation = 0
+        self.results = Queue()
+        # generation -> (generation, work, streaming, on_done, on_error, on_chunk) of started queries
+        self.jobs = {}
+        self.running = 0
+        self.closed = False
+        self._after_id = None
+        self._polling = False
+        # generation -> connection of the running queries; guarded by _lock so
+        # cancel() never reaches a connection that is already back in the pool
+        self._lock = threading.Lock()
+        self._active = {}
+
+    def run(self, work, on_done, on_error=None, delay=0):
+        """Run work(conn) after *delay* ms, superseding any earlier query.
+
+        on_done(result) or on_error(exception) is called on the Tk thread, and
+        only if no newer query has been started meanwhile.
+        """
+        self._submit((work, False, on_done, on_error, None), delay)
+
+    def stream(self, work, on_chunk, on_done, on_error=None, delay=0):
+        """Like run(), for a generator work(conn) that yields its result in chunks.
+
+        on_chunk(chunk) is called on the Tk thread for each chunk as it
+        arrives, then on_done(None). The generator is closed as soon as a
+        newer query supersedes it.
+        """
+        self._submit((work, True, on_done, on_error, on_chunk), delay)
+
+    def _submit(self, job, delay):
+        if self.closed:
+            return
+        self.generation += 1
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        job = (self.generation,) + job
+        if delay:
+            self._after_id = self.widget.after(delay, self._start, job)
+        else:
+            self._start(job)
+
+    def _start(self, job):
+        self._after_id = None
+        self.cancel_running()
+        self.running += 1
+        self.jobs[job[0]] = job
+        threading.Thread(target=self._work, args=job[:3], daemon=True).start()
+        if not self._polling:
+            self._polling = True
+            self.widget.after(RESULT_POLL_MS, self._poll)
+
+    def _work(self, generation, work, streaming):
+        try:
+            with get_pg_connection() as conn:
+                with self._lock:
+                    self._active[generation] = conn
+                try:
+                    result = work(conn)
+                    if streaming:
+                        for chunk in result:
+                            if generation != self.generation:
+                                break
+                            self.results.put((generation, "chunk", chunk))
+                        result.close()
+                        result = None
+                finally:
+                    with self._lock:
+                        del self._active[generation]
+            self.results.put((generation, "done", result))
+        except Exception as e:
+            self.results.put((generation, "error", e))
+
+    def cancel_running(self):
+        """Ask the server to cancel the queries that are still running."""
+        with self._lock:
+            for conn in self._active.values():
+                try:
+                    conn.cancel()
+                except Exception as e:
+                    print(f"Cancelling query failed: {e}")
+
+    def _poll(self):
+        if self.closed:
+            return
+        while True:
+            try:
+                generation, kind, value = self.results.get_nowait()
+            except Empty:
+                break
+            _, _, _, on_done, on_error, on_chunk = self.jobs[generation]
+            if kind != "chunk":
+                self.running -= 1
+                del self.jobs[generation]
+            if generation != self.generation:
+                continue
+            if kind == "chunk":
+                on_chunk(value)
+            elif kind == "done":
+                on_done(value)
+            elif getattr(value, "pgcode", None) == QUERY_CANCELED:
+                continue
+            elif on_error is not None:
+                on_error(value)
+            else:
+                print(f"Background query failed: {value}")
+        if self.running:
+            try:
+                self.widget.after(RESULT_POLL_MS, self._poll)
+            except tk.TclError:
+                self._polling = False
+        else:
+            self._polling = False
+
+    def cancel(self):
+        """Drop the pending query and cancel the running ones; their results are ignored."""
+        self.generation += 1
+        if self._after_id is not None:
+            self.widget.after_cancel(self._after_id)
+            self._after_id = None
+        self.cancel_running()
+
+    def close(self):
+        """Cancel pending and running queries; call when the window closes."""
+        self.closed = True
+        self.cancel()
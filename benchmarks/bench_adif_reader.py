@@ -0,0 +1,80 @@
+"""Micro-benchmark: streaming ADIF reader vs. the old line-based regex parser.
+
+    python benchmarks/bench_adif_reader.py [records]
+"""
+
+import io
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from adif_reader import read_adif
+
+
+# The parser adi_import used before adif_reader, kept here as the baseline
+def parse_adif_line(line):
+    fields = {}
+    matches = re.findall(r"<(\w+)(?::\d+)(?::\w+)?>((?:(?!<\w+:).)*)", line)
+    for key, value in matches:
+        fields[key.upper()] = value.strip()
+    return fields
+
+
+def legacy_read(f):
+    lines = [line.strip() for line in f if line.strip().startswith("<") and "<EOR>" in line.upper()]
+    return [parse_adif_line(line) for line in lines]
+
+
+def field(name, value):
+    return f"<{name}:{len(value)}>{value} "
+
+
+def make_log(count):
+    out = io.StringIO()
+    out.write("WSJT-X ADIF Export\n<adif_ver:5>3.1.0 <programid:6>WSJT-X <EOH>\n")
+    for i in range(count):
+        out.write(
+            field("call", f"OH{i % 10}A{chr(65 + i % 26)}{chr(65 + i // 26 % 26)}")
+            + field("gridsquare", "KP20")
+            + field("mode", "FT8")
+            + field("rst_sent", "-10")
+            + field("rst_rcvd", "-12")
+            + field("qso_date", "20240101")
+            + field("time_on", f"{i // 3600 % 24:02d}{i // 60 % 60:02d}{i % 60:02d}")
+            + field("qso_date_off", "20240101")
+            + field("time_off", "120015")
+            + field("band", "20m")
+            + field("freq", "14.074123")
+            + field("station_callsign", "OH3AA")
+            + field("my_gridsquare", "KP20lk")
+            + "<EOR>\n"
+        )
+    return out.getvalue().encode("utf-8")
+
+
+def timed(label, count, func):
+    start = time.perf_counter()
+    records = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {len(records):>9} records  {elapsed:7.3f} s  {count / elapsed:>10.0f} rec/s")
+    return records
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    data = make_log(count)
+    print(f"{count} records, {len(data) / 1e6:.1f} MB")
+
+    legacy = timed("regex", count, lambda: legacy_read(io.StringIO(data.decode("utf-8"))))
+    stream = timed("streaming", count, lambda: list(read_adif(io.BytesIO(data))))
+    differing = sum(1 for old, new in zip(legacy, stream) if old != new)
+    if differing or len(legacy) != len(stream):
+        # the regex keeps "<EOR>" in the last field value and misses multi-line records
+        print(f"records parsed differently: {differing + abs(len(legacy) - len(stream))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Synthetic ADIF log generator for import benchmarks.
+
+    python benchmarks/gen_adif.py OUT.adi [--records 100000] [--dup-ratio 0.05]
+        [--multiline-ratio 0.1] [--malformed-ratio 0.001] [--seed 1]
+
+Produces WSJT-X-like logs: a handful of operators working a large pool of
+callsigns (some portable, e.g. OH0/OH3AA/M) on the usual digital, CW and
+phone frequencies over consecutive days. A share of the records repeat an
+earlier QSO within the duplicate window (some with a better QSO_COMPLETE),
+some are split over several lines and some are malformed.
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+PREFIXES = ("OH", "SM", "LA", "OZ", "ES", "DL", "G", "F", "I", "EA", "SP", "OK", "HA", "UA",
+            "K", "W", "N", "VE", "JA", "VK", "ZL", "PY", "LU", "ZS")
+FREQUENCIES = {
+    "FT8": (1.840, 3.573, 7.074, 10.136, 14.074, 18.100, 21.074, 24.915, 28.074, 50.313),
+    "FT4": (3.575, 7.047, 10.140, 14.080, 18.104, 21.140, 28.180),
+    "CW": (3.520, 7.020, 10.115, 14.025, 21.030, 28.030),
+    "SSB": (3.750, 7.150, 14.250, 21.300, 28.500),
+}
+MODES = ("FT8",) * 7 + ("FT4",) * 2 + ("CW", "SSB")
+PORTABLE = ("{call}/P", "{call}/M", "{call}/QRP", "OH0/{call}", "OH0/{call}/M")
+MALFORMED = (
+    lambda f: f.update(QSO_DATE="2024-13-45"),
+    lambda f: f.update(FREQ="14.074.1"),
+    lambda f: f.update(TIME_ON="25:61"),
+    lambda f: f.update(CALL="X" * 25),
+    lambda f: f.update(APP_PSKREP_SNR="loud"),
+)
+
+
+def random_callsign(rng):
+    suffix = "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(rng.choice((2, 3, 3))))
+    return f"{rng.choice(PREFIXES)}{rng.randint(0, 9)}{suffix}"
+
+
+def format_field(name, value):
+    data = str(value).encode("utf-8")
+    return b"<%s:%d>%s" % (name.encode("ascii"), len(data), data)
+
+
+def generate_records(count, dup_ratio=0.05, malformed_ratio=0.001, seed=1,
+                     calls=20000, operators=3, start=date(2024, 1, 1), per_day=2000):
+    """Yield *count* record dicts (field name -> value)."""
+    rng = random.Random(seed)
+    ops = [random_callsign(rng) for _ in range(operators)]
+    pool = [random_callsign(rng) for _ in range(calls)]
+    recent = []
+    clock = datetime.combine(start, datetime.min.time())
+    step = 86400 / per_day
+
+    for _ in range(count):
+        if recent and rng.random() < dup_ratio:
+            # the same QSO logged again a little later, sometimes confirmed this time
+            fields = dict(rng.choice(recent))
+            on = datetime.strptime(fields["QSO_DATE"] + fields["TIME_ON"], "%Y%m%d%H%M%S")
+            on = min(on + timedelta(seconds=rng.randint(0, 170)), on.replace(hour=23, minute=59, second=59))
+            fields["TIME_ON"] = on.strftime("%H%M%S")
+            if rng.random() < 0.3:
+                fields["QSO_COMPLETE"] = "Y"
+        else:
+            clock += timedelta(seconds=rng.expovariate(1 / step))
+            mode = rng.choice(MODES)
+            call = rng.choice(pool)
+            if rng.random() < 0.02:
+                call = rng.choice(PORTABLE).format(call=call)
+            fields = {
+                "CALL": call,
+                "GRIDSQUARE": f"{rng.choice('IJKL')}{rng.choice('LMNOP')}{rng.randint(10, 99)}",
+                "MODE": mode,
+                "QSO_DATE": clock.strftime("%Y%m%d"),
+                "TIME_ON": clock.strftime("%H%M%S"),
+                "FREQ": f"{rng.choice(FREQUENCIES[mode]) + rng.randint(0, 3000) / 1e6:.6f}",
+                "OPERATOR": rng.choice(ops),
+                "MY_GRIDSQUARE": "KP20LK",
+                "APP_PSKREP_SNR": str(rng.randint(-24, 20)),
+                "DISTANCE": f"{rng.uniform(50, 19000):.1f}",
+                "DXCC": str(rng.randint(1, 500)),
+                "QSO_COMPLETE": rng.choice(("1", "1", "1", "N", "Y")),
+            }
+            recent.append(fields)
+            if len(recent) > 500:
+                recent.pop(0)
+        if rng.random() < malformed_ratio:
+            fields = dict(fields)
+            rng.choice(MALFORMED)(fields)
+        yield fields
+
+
+def write_adif(f, records, multiline_ratio=0.1, seed=1):
+    """Write *records* to binary file *f*; a share of them is split over several lines."""
+    rng = random.Random(seed + 1)
+    f.write(b"Synthetic ADIF log for HamData import benchmarks\n<ADIF_VER:5>3.1.4 <PROGRAMID:7>gen_adif <EOH>\n")
+    for fields in records:
+        parts = [format_field(name, value) for name, value in fields.items()]
+        separator = b"\n" if rng.random() < multiline_ratio else b" "
+        f.write(separator.join(parts) + b" <EOR>\n")
+
+
+def generate_file(path, count, dup_ratio=0.05, multiline_ratio=0.1, malformed_ratio=0.001, seed=1):
+    with open(path, "wb") as f:
+        write_adif(f, generate_records(count, dup_ratio, malformed_ratio, seed), multiline_ratio, seed)
+    return os.path.getsize(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic ADIF log.")
+    parser.add_argument("output")
+    parser.add_argument("--records", type=int, default=100000, help="e.g. 10000, 100000 or 1000000")
+    parser.add_argument("--dup-ratio", type=float, default=0.05)
+    parser.add_argument("--multiline-ratio", type=float, default=0.1)
+    parser.add_argument("--malformed-ratio", type=float, default=0.001)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    size = generate_file(args.output, args.records, args.dup_ratio, args.multiline_ratio,
+                         args.malformed_ratio, args.seed)
+    print(f"{args.output}: {args.records} records, {size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
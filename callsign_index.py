@@ -0,0 +1,293 @@
+"""In-memory search index of the callsigns table.
+
+The callsign and QSO windows filter by callsign on every keystroke; with the
+index loaded that needs no database round trip. get_callsign_index() returns
+the process-wide index, which is read from the database on a worker thread
+the first time it is asked for; until it is ready (index.ready) the windows
+query the database as before.
+
+    callsigns sorted by callsign (bisect)    prefix search, e.g. "OH3"
+    trigram -> array of ids                  substring search of callsign and name
+
+Searches shorter than three characters are prefix searches of the callsign,
+longer ones substring searches. Trigram postings only ever grow; a changed
+name leaves stale entries behind, which is why every candidate is checked
+against its text.
+
+refresh() brings the index up to date: callsigns added since it was loaded
+(ids above the highest one known) are read and added, and if the number of
+rows then differs from row_counts, callsigns were deleted and the index is
+rebuilt. Windows call it when the index is older than REFRESH_SECONDS;
+refresh_callsign() re-reads one callsign after it was changed, e.g. by a QRZ
+lookup. An import adds callsigns in bulk: callsigns_changed() marks the index
+stale, and until the refresh it starts is done index.stale tells windows to
+query the database instead.
+
+Names are kept as "" for display; like ORDER BY wholename in the database,
+callsigns without a name (NULL) sort after all names.
+"""
+
+import bisect
+import threading
+import time
+from array import array
+from config import get_pg_connection
+from row_counts import table_count
+
+# Windows refresh the index when it is older than this
+REFRESH_SECONDS = 30
+# Rows read per round trip while loading
+LOAD_CHUNK_SIZE = 5000
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class CallsignIndex:
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.ready = False
+        self.loading = False
+        # callsigns_changed() calls so far, and how many of them the last refresh covers
+        self.changes = 0
+        self.changes_seen = 0
+        self.refreshed_at = 0.0
+        self.max_id = 0
+        # id -> (callsign, wholename)
+        self.rows = {}
+        # id -> lower-case "callsign<TAB>wholename", what substring searches match
+        self.texts = {}
+        self.sorted_calls = []
+        self.sorted_ids = []
+        self.postings = {}
+        # ids of the callsigns whose wholename is NULL
+        self.unnamed = set()
+        # sort column -> ids of all rows in that order, until rows change
+        self._orders = {}
+
+    # ---------- Loading ----------
+    def load_in_background(self):
+        """Load, or refresh, the index on a worker thread unless that is already running."""
+        with self._lock:
+            if self.loading:
+                return
+            self.loading = True
+            # changes made after this point are not necessarily seen by the refresh
+            changes = self.changes
+        threading.Thread(target=self._load_or_refresh, args=(changes,), daemon=True).start()
+
+    def _load_or_refresh(self, changes):
+        try:
+            if self.ready:
+                self.refresh()
+            else:
+                self.load()
+            self.changes_seen = changes
+        except Exception as e:
+            print(f"Loading the callsign index failed: {e}")
+        finally:
+            self.loading = False
+
+    def load(self):
+        """Read all callsigns and replace the index with them."""
+        fresh = CallsignIndex()
+        with get_pg_connection() as conn:
+            with conn.cursor(name="callsign_index") as cur:
+                cur.itersize = LOAD_CHUNK_SIZE
+                cur.execute("SELECT id, callsign, wholename FROM callsigns")
+                for row in cur:
+                    fresh._add(*row)
+        order = sorted(range(len(fresh.sorted_calls)), key=fresh.sorted_calls.__getitem__)
+        fresh.sorted_calls = [fresh.sorted_calls[i] for i in order]
+        fresh.sorted_ids = [fresh.sorted_ids[i] for i in order]
+        with self._lock:
+            self.rows, self.texts = fresh.rows, fresh.texts
+            self.sorted_calls, self.sorted_ids = fresh.sorted_calls, fresh.sorted_ids
+            self.postings, self.max_id = fresh.postings, fresh.max_id
+            self.unnamed = fresh.unnamed
+            self._orders = {}
+            self.refreshed_at = time.monotonic()
+            self.ready = True
+
+    def refresh(self):
+        """Add the callsigns created since the last refresh; rebuild if rows were deleted."""
+        with get_pg_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, callsign, wholename FROM callsigns WHERE id > %s",
+                            (self.max_id,))
+                added = cur.fetchall()
+                total = table_count(cur, "callsigns")
+        with self._lock:
+            for row in added:
+                self.update(*row)
+            self.refreshed_at = time.monotonic()
+            stale = total != len(self.rows)
+        if stale:
+            self.load()
+
+    def refresh_callsign(self, callsign):
+        """Re-read *callsign* after it was changed in the database."""
+        if not self.ready:
+            return
+        with get_pg_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT id, callsign, wholename FROM callsigns WHERE callsign = %s",
+                            (callsign,))
+                row = cur.fetchone()
+        if row is not None:
+            self.update(*row)
+
+    @property
+    def stale(self):
+        """True from a callsigns_changed() call until a refresh started after it is done."""
+        return self.changes != self.changes_seen
+
+    def needs_refresh(self):
+        return self.stale or time.monotonic() - self.refreshed_at > REFRESH_SECONDS
+
+    def mark_stale(self):
+        """Note that callsigns were added without going through update()."""
+        with self._lock:
+            self.changes += 1
+
+    # ---------- Changes ----------
+    def _add(self, id_, callsign, wholename):
+        """Add a row during load; sorted_calls is sorted afterwards."""
+        if wholename is None:
+            self.unnamed.add(id_)
+            wholename = ""
+        self.rows[id_] = (callsign, wholename)
+        text = f"{callsign}\t{wholename}".lower()
+        self.texts[id_] = text
+        self.sorted_calls.append(callsign)
+        self.sorted_ids.append(id_)
+        for gram in trigrams(text):
+            posting = self.postings.get(gram)
+            if posting is None:
+                posting = self.postings[gram] = array("i")
+            posting.append(id_)
+        self.max_id = max(self.max_id, id_)
+
+    def update(self, id_, callsign, wholename):
+        """Add or change one row."""
+        with self._lock:
+            unnamed = wholename is None
+            if unnamed:
+                wholename = ""
+            old = self.rows.get(id_)
+            if old == (callsign, wholename) and unnamed == (id_ in self.unnamed):
+                return
+            if unnamed:
+                self.unnamed.add(id_)
+            else:
+                self.unnamed.discard(id_)
+            if old is not None and old[0] != callsign:
+                i = bisect.bisect_left(self.sorted_calls, old[0])
+                del self.sorted_calls[i]
+                del self.sorted_ids[i]
+            if old is None or old[0] != callsign:
+                i = bisect.bisect_left(self.sorted_calls, callsign)
+                self.sorted_calls.insert(i, callsign)
+                self.sorted_ids.insert(i, id_)
+            self.rows[id_] = (callsign, wholename)
+            text = f"{callsign}\t{wholename}".lower()
+            new_grams = trigrams(text) - trigrams(self.texts.get(id_, ""))
+            self.texts[id_] = text
+            for gram in new_grams:
+                posting = self.postings.get(gram)
+                if posting is None:
+                    posting = self.postings[gram] = array("i")
+                posting.append(id_)
+            self.max_id = max(self.max_id, id_)
+            self._orders = {}
+
+    # ---------- Searching ----------
+    def prefix_search(self, prefix, limit=None):
+        """Return the ids of the callsigns starting with *prefix*, in callsign order, or None if more than *limit*."""
+        prefix = prefix.strip().upper()
+        with self._lock:
+            start = bisect.bisect_left(self.sorted_calls, prefix)
+            end = bisect.bisect_left(self.sorted_calls, prefix + "\uffff", start)
+            if limit is not None and end - start > limit:
+                return None
+            return self.sorted_ids[start:end]
+
+    def search(self, text, names=True, limit=None):
+        """Return the ids of the callsigns matching *text*, or None if more than *limit* match.
+
+        Text shorter than three characters matches the start of the
+        callsign, longer text anywhere in the callsign or, with *names*, the
+        name.
+        """
+        text = text.strip().lower()
+        if len(text) < 3:
+            return self.prefix_search(text, limit)
+        with self._lock:
+            postings = [self.postings.get(gram) for gram in trigrams(text)]
+            if not all(postings):
+                return []
+            candidates = min(postings, key=len)
+            texts = self.texts
+            if names:
+                ids = {i for i in candidates if text in texts[i]}
+            else:
+                ids = {i for i in candidates if text in texts[i].split("\t", 1)[0]}
+            if limit is not None and len(ids) > limit:
+                return None
+            return list(ids)
+
+    def _name_key(self, id_):
+        callsign, wholename = self.rows[id_]
+        return id_ in self.unnamed, wholename, callsign
+
+    def sorted_rows(self, ids, column="callsign", descending=False):
+        """Return (callsign, wholename) of *ids* (all rows if None) sorted by *column*."""
+        with self._lock:
+            order = self._orders.get(column)
+            if order is None:
+                if column == "callsign":
+                    order = list(self.sorted_ids)
+                else:
+                    order = sorted(self.rows, key=self._name_key)
+                self._orders[column] = order
+            if ids is None:
+                selected = order
+            elif len(ids) * 8 > len(order):
+                # a large share of the rows: filtering the sorted list beats sorting
+                wanted = set(ids)
+                selected = [i for i in order if i in wanted]
+            else:
+                rows = self.rows
+                if column == "callsign":
+                    selected = sorted(ids, key=lambda i: rows[i][0])
+                else:
+                    selected = sorted(ids, key=self._name_key)
+            rows = [self.rows[i] for i in selected]
+        if descending:
+            rows.reverse()
+        return rows
+
+
+_index = CallsignIndex()
+
+
+def get_callsign_index():
+    """The shared index; starts loading or refreshing it in the background when due."""
+    if not _index.ready or _index.needs_refresh():
+        _index.load_in_background()
+    return _index
+
+
+def callsigns_changed():
+    """Mark the shared index stale after callsigns were added in bulk, e.g. by an import."""
+    _index.mark_stale()
+    if _index.ready:
+        _index.load_in_background()
+
+
+def refresh_callsign(callsign):
+    try:
+        _index.refresh_callsign(callsign)
+    except Exception as e:
+        print(f"Updating the callsign index failed: {e}")
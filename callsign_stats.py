@@ -0,0 +1,68 @@
+"""Per-callsign QSO summary of the callsign detail window.
+
+The callsign_stats table (migration 10) holds one row per callsign with QSOs:
+their number, first and last QSO, best PSK Reporter SNR, longest distance,
+and the bands and modes worked as bitmaps. Triggers on qsos keep it current,
+so the detail window reads it with the callsign in one indexed lookup instead
+of aggregating the callsign's QSOs. The QSOs themselves are listed a page at a
+time, newest first, along qsos_call_id_idx (migration 9).
+
+Bit i of the bands bitmap is BANDS[i] of qso_filter, bit i of the modes
+bitmap MODES[i]; other modes share bit OTHER_MODE_BIT.
+"""
+
+from config import execute_prepared
+from qso_filter import BANDS
+
+# Modes with a bit of their own, in bit order as in migration 10
+MODES = (
+    "CW", "SSB", "AM", "FM", "RTTY", "PSK", "FT8", "FT4", "JT65", "JT9", "JS8", "MFSK", "OLIVIA",
+    "SSTV", "WSPR", "Q65", "MSK144", "DIGITALVOICE", "HELL", "CONTESTI", "PKT",
+)
+OTHER_MODE_BIT = 30
+
+# Columns of callsign_stats the detail window shows, in order
+STATS_COLUMNS = ("qso_count", "bands", "modes", "first_qso", "last_qso", "best_snr", "max_distance")
+
+# QSOs per page of the detail window's QSO list
+RECENT_PAGE_SIZE = 50
+
+RECENT_COLUMNS = ("qso_date", "time_on", "freq", "band", "mode", "raw_operator")
+
+
+def band_names(bits):
+    """Return the names of the bands set in a bands bitmap, lowest frequency first."""
+    return [name for i, (name, _, _) in enumerate(BANDS) if bits & (1 << i)]
+
+
+def mode_names(bits):
+    """Return the names of the modes set in a modes bitmap."""
+    names = [mode for i, mode in enumerate(MODES) if bits & (1 << i)]
+    if bits & (1 << OTHER_MODE_BIT):
+        names.append("other")
+    return names
+
+
+def recent_qsos_sql(call_id, after=None, limit=RECENT_PAGE_SIZE):
+    """Return (query, params) of up to *limit* QSOs with *call_id* after key *after*, newest first."""
+    columns = ", ".join(RECENT_COLUMNS)
+    if after is None:
+        return f"""
+            SELECT {columns}, qso_date, time_on, id FROM qsos WHERE call_id = %s
+            ORDER BY qso_date DESC, time_on DESC, id DESC LIMIT %s
+        """, (call_id, limit)
+    return f"""
+        SELECT {columns}, qso_date, time_on, id FROM qsos
+        WHERE call_id = %s AND (qso_date, time_on, id) < (%s, %s, %s)
+        ORDER BY qso_date DESC, time_on DESC, id DESC LIMIT %s
+    """, (call_id, *after, limit)
+
+
+def recent_qsos(cur, call_id, after=None, limit=RECENT_PAGE_SIZE):
+    """Return up to *limit* QSOs with *call_id*, newest first.
+
+    Each row is RECENT_COLUMNS followed by (qso_date, time_on, id), the key to
+    pass as *after* for the next page.
+    """
+    execute_prepared(cur, *recent_qsos_sql(call_id, after, limit))
+    return cur.fetchall()
@@ -5,28 +5,44 @@ Cleaned and auto‑formatted (4‑space indents)."""
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-from PIL import Image, ImageTk
 import os
-import psycopg2
-from config import DB_SETTINGS
+from config import get_pg_connection
+from query_stats import timed
 import json
 
+from callsign_stats import (RECENT_COLUMNS, RECENT_PAGE_SIZE, STATS_COLUMNS, band_names, mode_names,
+                            recent_qsos)
+
 from qrz_api import update_callsign_from_qrz
+from thumbnail_cache import photo_image
+from window_prefs import load_window_geometry, save_window_geometry
 
+# Where older versions kept the window size; read once if gen_settings has none
 SETTINGS_FILE = "callsign_detail_size.json"
 
+# The callsign with its QSO summary from callsign_stats, in one lookup
+DETAIL_SQL = f"""
+    SELECT c.*, {", ".join(f"s.{c}" for c in STATS_COLUMNS)} FROM callsigns c
+    LEFT JOIN callsign_stats s ON s.call_id = c.id WHERE c.callsign = %s
+"""
+
 
-def load_window_size():
+def load_window_size() -> str:
+    """Return the saved size of the detail window as "WIDTHxHEIGHT"."""
+    size = load_window_geometry("callsign_detail")
+    if size:
+        return size
     try:
         with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+            size = json.load(f)
+        return f"{size['width']}x{size['height']}"
     except Exception:
-        return {"width": 600, "height": 500}
+        return "600x500"
 
 
 def save_window_size(width: int, height: int) -> None:
-    with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-        json.dump({"width": width, "height": height}, f)
+    """Remember the window size; the settings store writes it once resizing stops."""
+    save_window_geometry("callsign_detail", f"{width}x{height}")
 
 
 def open_callsign_detail(callsign_str: str, parent_refresh_callback=None):
@@ -37,31 +53,33 @@ def open_callsign_detail(callsign_str: str, parent_refresh_callback=None):
     """
     # ------------------------------------------------------------------
     # Load row from DB --------------------------------------------------
-    conn = psycopg2.connect(**DB_SETTINGS)
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM callsigns WHERE callsign = %s", (callsign_str,))
-    row = cur.fetchone()
-    colnames = [desc[0] for desc in cur.description]
-    cur.close()
-    conn.close()
+    with timed("Callsign detail: query"), get_pg_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(DETAIL_SQL, (callsign_str,))
+            row = cur.fetchone()
+            colnames = [desc[0] for desc in cur.description]
+            recent = recent_qsos(cur, row[colnames.index("id")]) if row and row[-len(STATS_COLUMNS)] else []
 
     if not row:
         messagebox.showerror("Error", f"Callsign {callsign_str} not found.")
         return
 
-    data = dict(zip(colnames, row))
+    split = len(colnames) - len(STATS_COLUMNS)
+    data = dict(zip(colnames[:split], row[:split]))
+    stats = dict(zip(STATS_COLUMNS, row[split:]))
     size = load_window_size()
 
     # ------------------------------------------------------------------
     # Build UI ----------------------------------------------------------
     window = tk.Toplevel()
     window.title(f"Details for {callsign_str}")
-    window.geometry(f"{size['width']}x{size['height']}")
+    window.geometry(size)
     window.minsize(400, 300)
 
-    # Save geometry on resize
+    # Save geometry on resize (child widgets report their own <Configure> too)
     def on_resize(event):
-        save_window_size(event.width, event.height)
+        if event.widget is window:
+            save_window_size(event.width, event.height)
 
     window.bind("<Configure>", on_resize)
 
@@ -81,9 +99,7 @@ def open_callsign_detail(callsign_str: str, parent_refresh_callback=None):
     # Portrait if present
     if data.get("image") and os.path.isfile(data["image"]):
         try:
-            img = Image.open(data["image"])
-            img.thumbnail((120, 120))
-            photo = ImageTk.PhotoImage(img)
+            photo = photo_image(data["image"], 120, 120)
             img_label = tk.Label(top_frame, image=photo)
             img_label.image = photo  # keep ref
             img_label.grid(row=0, column=1, rowspan=6, padx=10, sticky="ne")
@@ -110,6 +126,58 @@ def open_callsign_detail(callsign_str: str, parent_refresh_callback=None):
             lbl.grid(row=row_index, column=0, sticky="w", pady=2)
             row_index += 1
 
+    # QSO summary and the QSOs, newest first -------------------------
+    qso_frame = ttk.LabelFrame(window, text="QSOs")
+    qso_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+    if stats["qso_count"]:
+        summary = [
+            f"{stats['qso_count']} QSOs, {stats['first_qso']:%Y-%m-%d} to {stats['last_qso']:%Y-%m-%d}",
+            "Bands: " + " ".join(band_names(stats["bands"])),
+            "Modes: " + " ".join(mode_names(stats["modes"])),
+        ]
+        best = []
+        if stats["best_snr"] is not None:
+            best.append(f"best SNR {stats['best_snr']} dB")
+        if stats["max_distance"]:
+            best.append(f"longest {stats['max_distance']:.0f} km")
+        if best:
+            summary.append(", ".join(best).capitalize())
+    else:
+        summary = ["No QSOs"]
+    ttk.Label(qso_frame, text="\n".join(summary), justify=tk.LEFT).pack(anchor="w", padx=5, pady=5)
+
+    qso_tree = ttk.Treeview(qso_frame, columns=RECENT_COLUMNS, show="headings", height=6)
+    for col, heading in zip(RECENT_COLUMNS, ("Date", "Time", "Freq", "Band", "Mode", "Operator")):
+        qso_tree.heading(col, text=heading)
+        qso_tree.column(col, width=80)
+    qso_tree.pack(fill=tk.BOTH, expand=True, padx=5)
+
+    # key of the last QSO listed, where the next page starts
+    last_key = [None]
+
+    def add_qsos(rows):
+        for r in rows:
+            qso_tree.insert("", "end", values=r[:len(RECENT_COLUMNS)])
+        if rows:
+            last_key[0] = rows[-1][len(RECENT_COLUMNS):]
+        if len(rows) < RECENT_PAGE_SIZE:
+            more_btn.config(state=tk.DISABLED)
+
+    def more_qsos():
+        try:
+            with get_pg_connection() as conn:
+                with conn.cursor() as cur:
+                    rows = recent_qsos(cur, data["id"], last_key[0])
+        except Exception as exc:
+            messagebox.showerror("Error", f"Loading QSOs failed: {exc}")
+            return
+        add_qsos(rows)
+
+    more_btn = ttk.Button(qso_frame, text="More", command=more_qsos)
+    more_btn.pack(anchor="e", padx=5, pady=5)
+    add_qsos(recent)
+
     # Text frame for all columns --------------------------------------
     text_frame = ttk.Frame(window)
     text_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
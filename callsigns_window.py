@@ -1,9 +1,39 @@
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox
-from config import get_pg_connection
+from background_query import FILTER_DELAY_MS, BackgroundQuery
+from callsign_index import get_callsign_index
+from query_stats import timed
+from row_counts import table_count
+from virtual_tree import VirtualTree
 from window_prefs import load_window_geometry, save_window_geometry
 
+# Rows read from the server-side cursor per round trip
+CHUNK_SIZE = 2000
+
+COLUMNS = ("callsign", "wholename")
+# ORDER BY of each sortable column; callsign is unique and breaks ties
+SORT_KEYS = {
+    "callsign": ("callsign",),
+    "wholename": ("wholename", "callsign"),
+}
+
+
+def callsign_list_sql(filter_text, sort_column="callsign", sort_descending=False):
+    """Return (query, params) of the callsigns whose callsign or name contains *filter_text*, sorted."""
+    order = "DESC" if sort_descending else "ASC"
+    order_by = ", ".join(f"{c} {order}" for c in SORT_KEYS[sort_column])
+    if not filter_text:
+        return f"SELECT callsign, wholename FROM callsigns ORDER BY {order_by}", ()
+    like_filter = f"%{filter_text}%"
+    return f"""
+        SELECT callsign, wholename
+        FROM callsigns
+        WHERE callsign ILIKE %s OR wholename ILIKE %s
+        ORDER BY {order_by}
+    """, (like_filter, like_filter)
+
+
 def open_callsigns_window(master=None):
     CallsignsWindow(master)
 
@@ -20,6 +50,11 @@ class CallsignsWindow(tk.Toplevel):
 
         self.protocol("WM_DELETE_WINDOW", self.on_close)
 
+        self.sort_column = "callsign"
+        self.sort_descending = False
+        self.query = BackgroundQuery(self)
+        self.total_records = 0
+
         self.create_widgets()
         self.load_callsigns()
 
@@ -32,7 +67,7 @@ class CallsignsWindow(tk.Toplevel):
 
         ttk.Label(filter_frame, text="Filter:").pack(side="left")
         self.filter_var = tk.StringVar()
-        self.filter_var.trace_add("write", lambda *_: self.load_callsigns())
+        self.filter_var.trace_add("write", lambda *_: self.load_callsigns(FILTER_DELAY_MS))
         self.filter_entry = ttk.Entry(filter_frame, textvariable=self.filter_var)
         self.filter_entry.pack(side="left", fill="x", expand=True)
 
@@ -43,18 +78,14 @@ class CallsignsWindow(tk.Toplevel):
         tree_frame.rowconfigure(0, weight=1)
         tree_frame.columnconfigure(0, weight=1)
 
-        columns = ("callsign", "wholename")
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
-        for col in columns:
-            self.tree.heading(col, text=col.replace("_", " ").title(),
-                              command=lambda c=col: self.treeview_sort_column(c, False))
+        # only the rows in view are Treeview items; see virtual_tree
+        self.list = VirtualTree(tree_frame, COLUMNS)
+        self.list.grid(row=0, column=0, sticky="nsew")
+        self.tree = self.list.tree
+        for col in COLUMNS:
+            self.tree.heading(col, command=lambda c=col: self.sort_by(c))
             self.tree.column(col, width=100)
-
-        self.tree.grid(row=0, column=0, sticky="nsew")
-
-        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
-        scrollbar.grid(row=0, column=1, sticky="ns")
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.update_headings()
 
         self.tree.bind("<Double-1>", lambda e: self.open_detail())
 
@@ -81,50 +112,93 @@ class CallsignsWindow(tk.Toplevel):
         self.clock_var.set(datetime.now().strftime("%H:%M:%S"))
         self.after(1000, self.update_clock)
 
-    def load_callsigns(self):
+    def sort_by(self, column):
+        """Sort the list by *column* on the server; clicking the sorted column reverses the order."""
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = False
+        self.update_headings()
+        self.load_callsigns()
+
+    def update_headings(self):
+        """Mark the sort column's heading with the sort direction."""
+        for col in COLUMNS:
+            text = col.replace("_", " ").title()
+            if col == self.sort_column:
+                text += " \u25bc" if self.sort_descending else " \u25b2"
+            self.tree.heading(col, text=text)
+
+    def load_callsigns(self, delay=0):
+        """Show the callsigns matching the filter, in sort order.
+
+        They come from the shared callsign index once it is loaded and
+        while it is not stale after an import. Otherwise they are read from a
+        server-side cursor in chunks of CHUNK_SIZE
+        on a worker thread and appended to the list as they arrive, so the
+        first screenful shows before the whole table is read.
+        """
         filter_text = self.filter_var.get().strip()
 
-        try:
-            conn = get_pg_connection()
-            cur = conn.cursor()
-            cur.execute("SELECT COUNT(*) FROM callsigns")
-            total_records = cur.fetchone()[0]
-            if filter_text:
-                query = """
-                SELECT callsign, wholename
-                FROM callsigns
-                WHERE callsign ILIKE %s OR wholename ILIKE %s
-                ORDER BY callsign
-                """
-                like_filter = f"%{filter_text}%"
-                cur.execute(query, (like_filter, like_filter))
-            else:
-                query = "SELECT callsign, wholename FROM callsigns ORDER BY callsign"
-                cur.execute(query)
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
-
-            # Clear current treeview items
-            for item in self.tree.get_children():
-                self.tree.delete(item)
-
-            for row in rows:
-                self.tree.insert("", "end", values=row)
-            self.status_var.set(f"Callsigns: {len(rows)}/{total_records}")
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error loading callsigns:\n{e}")
+        index = get_callsign_index()
+        if index.ready and not index.stale:
+            self.query.cancel()
+            with timed("Callsigns: index search"):
+                ids = index.search(filter_text) if filter_text else None
+                rows = index.sorted_rows(ids, self.sort_column, self.sort_descending)
+            self.list.set_rows(rows)
+            self.total_records = len(index.rows)
+            self.callsigns_loaded(None)
+            return
+
+        query, params = callsign_list_sql(filter_text, self.sort_column, self.sort_descending)
+
+        def fetch(conn):
+            with conn.cursor() as cur:
+                yield "total", table_count(cur, "callsigns")
+            conn.commit()
+            # a named cursor lives in the server until the transaction ends
+            with timed("Callsigns: query"), conn.cursor(name="callsign_list") as cur:
+                cur.itersize = CHUNK_SIZE
+                cur.execute(query, params)
+                while True:
+                    rows = cur.fetchmany(CHUNK_SIZE)
+                    if not rows:
+                        break
+                    yield "rows", rows
+
+        self.status_var.set("Loading callsigns...")
+        self.query.stream(fetch, self.add_callsigns, self.callsigns_loaded, self.show_load_error, delay)
+
+    def add_callsigns(self, chunk):
+        kind, value = chunk
+        if kind == "total":
+            # the first chunk of a new list; the old one stays until now
+            self.total_records = value
+            self.list.set_rows([])
+            return
+        with timed("Callsigns: fill list"):
+            self.list.extend(value)
+        self.status_var.set(f"Loading callsigns... {len(self.list.rows)}/{self.total_records}")
+
+    def callsigns_loaded(self, result):
+        self.status_var.set(f"Callsigns: {len(self.list.rows)}/{self.total_records}")
+
+    def show_load_error(self, error):
+        self.status_var.set("")
+        messagebox.showerror("Error", f"Error loading callsigns:\n{error}", parent=self)
 
     def open_detail(self):
-        selected = self.tree.selection()
-        if not selected:
+        row = self.list.selected_row()
+        if row is None:
             messagebox.showinfo("Info", "Please select a callsign.")
             return
-        callsign = self.tree.item(selected[0])["values"][0]
+        callsign = row[0]
         from callsigns_detail import open_callsign_detail
         open_callsign_detail(callsign, parent_refresh_callback=self.load_callsigns)
 
     def on_close(self):
+        self.query.close()
         save_window_geometry("callsigns", self.geometry())
         self.destroy()
\ No newline at end of file
@@ -7,13 +7,24 @@ DB_SETTINGS = {
     "password": "PostiRessi22!"
 }
 
-import psycopg2
 
 def get_pg_connection():
-    return psycopg2.connect(
-        dbname=DB_SETTINGS["database"],
-        user=DB_SETTINGS["user"],
-        password=DB_SETTINGS["password"],
-        host=DB_SETTINGS["host"],
-        port=DB_SETTINGS["port"]
-    )
+    """Check out a pooled connection; close it, or use it in a `with` block, to return it."""
+    # db_pool imports psycopg2, so it is loaded on first use instead of at startup
+    from db_pool import get_pool
+    return get_pool().getconn()
+
+
+def get_pool():
+    from db_pool import get_pool
+    return get_pool()
+
+
+def pool_stats():
+    from db_pool import pool_stats
+    return pool_stats()
+
+
+def execute_prepared(cur, query, params=()):
+    from db_pool import execute_prepared
+    return execute_prepared(cur, query, params)
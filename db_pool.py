@@ -0,0 +1,302 @@
+"""Pooled, instrumented PostgreSQL connections.
+
+Everything here needs psycopg2, so it is imported on first database use
+rather than at startup; the rest of the application goes through config.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+import psycopg2
+import psycopg2.extensions
+from psycopg2.pool import PoolError
+from config import DB_SETTINGS
+from query_stats import call_site, record_query, statement_text
+
+# Connections the pool opens at most; further checkouts wait for a free one
+POOL_MAX_SIZE = 8
+# Seconds a checkout waits for a free connection before raising PoolError
+POOL_TIMEOUT = 30
+# Idle connections older than this are pinged before they are handed out
+POOL_CHECK_AFTER_SECONDS = 30
+# Prepared statements kept per connection; the least recently used one is
+# deallocated when a new one would exceed this
+MAX_PREPARED = 64
+
+_PLACEHOLDER = re.compile(r"%[s%]")
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """Cursor that records every statement it runs.
+
+    `label` replaces the statement text for the next execute(); execute_prepared
+    sets it so EXECUTEs are listed under the query they run.
+    """
+
+    label = None
+
+    def _record(self, query, started):
+        seconds = time.perf_counter() - started
+        text = self.label or statement_text(query)
+        self.label = None
+        record_query(text, seconds, self.rowcount, call_site())
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, started)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, started)
+
+    def copy_expert(self, sql, file, size=8192):
+        started = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            self._record(sql, started)
+
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that goes back to its pool instead of closing.
+
+    close() and the end of a `with` block (after the usual commit/rollback)
+    hand the connection back; discard() really closes it. `prepared` maps
+    query text to the name of its server-side prepared statement, least
+    recently used first. Cursors
+    are TimedCursors unless another cursor_factory is given.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_factory = TimedCursor
+        self.pool = None
+        self.checked_out = False
+        self.last_used = time.monotonic()
+        self.prepared = OrderedDict()
+        self.prepared_count = 0
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if not self.closed:
+                return super().__exit__(exc_type, exc_value, traceback)
+        finally:
+            self.close()
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        elif self.checked_out:
+            self.pool.putconn(self)
+
+    def __del__(self):
+        # dropped without being returned: free its slot in the pool
+        if self.checked_out and self.pool is not None:
+            self.pool._forget(self)
+
+    def discard(self):
+        self.pool = None
+        self.checked_out = False
+        if not self.closed:
+            super().close()
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of PooledConnections to DB_SETTINGS.
+
+    Connections are reused most-recently-returned first, so the pool stays as
+    small as the real concurrency. A connection is rolled back when it is
+    returned, discarded when it turns out to be broken, and pinged before
+    reuse when it has been idle for a while. `stats` counts checkouts, waits
+    for a free connection and newly opened connections.
+    """
+
+    def __init__(self, maxconn=POOL_MAX_SIZE, timeout=POOL_TIMEOUT, check_after=POOL_CHECK_AFTER_SECONDS):
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_after = check_after
+        self.stats = {"checkouts": 0, "waits": 0, "wait_seconds": 0.0, "connections": 0, "discarded": 0}
+        self._cond = threading.Condition()
+        self._idle = []
+        self._size = 0
+        self._pid = os.getpid()
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+        if time.monotonic() - conn.last_used < self.check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        conn.discard()
+        self._forget(conn)
+
+    def _forget(self, conn):
+        conn.checked_out = False
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            self._size -= 1
+            self.stats["discarded"] += 1
+            self._cond.notify()
+
+    def getconn(self):
+        """Check out a connection, waiting up to `timeout` seconds for a free one."""
+        started = None
+        with self._cond:
+            self.stats["checkouts"] += 1
+        while True:
+            with self._cond:
+                while not self._idle and self._size >= self.maxconn:
+                    if started is None:
+                        started = time.monotonic()
+                        self.stats["waits"] += 1
+                    remaining = started + self.timeout - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(f"no free database connection after {self.timeout} s "
+                                        f"({self.maxconn} in use)")
+                    self._cond.wait(remaining)
+                if started is not None:
+                    self.stats["wait_seconds"] += time.monotonic() - started
+                    started = None
+                conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    self._size += 1
+
+            if conn is None:
+                try:
+                    conn = psycopg2.connect(**dict({"connection_factory": PooledConnection}, **DB_SETTINGS))
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self.stats["connections"] += 1
+            elif not self._healthy(conn):
+                self._discard(conn)
+                continue
+            conn.pool = self
+            conn.checked_out = True
+            return conn
+
+    def putconn(self, conn):
+        """Return *conn* to the pool; a broken connection is closed instead."""
+        conn.checked_out = False
+        if self._pid != os.getpid():
+            # inherited from the parent process, which still owns the session
+            return
+        if not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+                if conn.autocommit:
+                    conn.autocommit = False
+            except psycopg2.Error:
+                pass
+        if conn.closed or conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            self._discard(conn)
+            return
+        conn.last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        """Close the idle connections; checked-out ones are closed when they come back."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn in idle:
+            conn.discard()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+# Pools inherited through fork(); their connections belong to the parent's
+# sessions, so they are kept referenced and never closed in the child.
+_inherited_pools = []
+
+
+def _reset_after_fork():
+    global _pool, _pool_lock
+    if _pool is not None:
+        _inherited_pools.append(_pool)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def pool_stats():
+    """Return a copy of the pool counters plus the number of open and idle connections."""
+    pool = get_pool()
+    with pool._cond:
+        return dict(pool.stats, open=pool._size, idle=len(pool._idle))
+
+
+def execute_prepared(cur, query, params=()):
+    """Execute *query* (with %s placeholders) as a prepared statement of the cursor's connection.
+
+    The statement is PREPAREd the first time a connection sees the query and
+    EXECUTEd from then on, which saves parsing and planning for the queries
+    the windows repeat on every keystroke. Queries built from a filter differ
+    with every filter, so a connection keeps only the MAX_PREPARED most
+    recently used statements and DEALLOCATEs the others. On connections that
+    do not come from the pool the query is simply executed.
+    """
+    conn = cur.connection
+    prepared = getattr(conn, "prepared", None)
+    if prepared is None:
+        return cur.execute(query, params)
+    name = prepared.get(query)
+    if name is None:
+        count = 0
+
+        def number(match):
+            nonlocal count
+            if match.group() == "%%":
+                return "%"
+            count += 1
+            return f"${count}"
+
+        if len(prepared) >= MAX_PREPARED:
+            _, oldest = prepared.popitem(last=False)
+            cur.execute(f"DEALLOCATE {oldest}")
+        conn.prepared_count += 1
+        name = f"hamdata_{conn.prepared_count}"
+        cur.execute(f"PREPARE {name} AS {_PLACEHOLDER.sub(number, query)}")
+        prepared[query] = name
+    else:
+        prepared.move_to_end(query)
+    if isinstance(cur, TimedCursor):
+        cur.label = statement_text(query)
+    if params:
+        return cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    return cur.execute(f"EXECUTE {name}")
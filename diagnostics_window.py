@@ -0,0 +1,126 @@
+from datetime import datetime
+import tkinter as tk
+from tkinter import ttk
+from config import pool_stats
+from query_stats import (
+    query_summary, reset, set_slow_query_seconds, slow_queries, slow_query_seconds, timing_summary,
+)
+from settings_store import set_setting
+from window_prefs import load_window_geometry, save_window_geometry
+
+
+def open_diagnostics_window(master=None):
+    DiagnosticsWindow(master)
+
+
+def ms(seconds):
+    return f"{seconds * 1000:.1f}"
+
+
+class DiagnosticsWindow(tk.Toplevel):
+    """Statement statistics, the slow-query log and window load timings of this session."""
+
+    def __init__(self, master=None):
+        super().__init__(master)
+        self.title("Diagnostics")
+
+        geom = load_window_geometry("diagnostics")
+        if geom:
+            self.geometry(geom)
+        else:
+            self.geometry("1000x500")
+
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        self.create_widgets()
+        self.refresh()
+
+    def create_widgets(self):
+        notebook = ttk.Notebook(self)
+        notebook.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+
+        self.queries_tree = self.add_tab(notebook, "Queries", (
+            ("p95", "p95 ms", 70), ("p50", "p50 ms", 70), ("max", "Max ms", 70), ("count", "Calls", 60),
+            ("total", "Total ms", 80), ("rows", "Rows", 70), ("site", "Call site", 200), ("query", "Query", 500),
+        ))
+        self.slow_tree = self.add_tab(notebook, "Slow Queries", (
+            ("at", "Time", 70), ("ms", "ms", 70), ("rows", "Rows", 60), ("site", "Call site", 200),
+            ("query", "Query", 600),
+        ))
+        self.timings_tree = self.add_tab(notebook, "Window Timings", (
+            ("name", "Step", 200), ("p95", "p95 ms", 70), ("p50", "p50 ms", 70), ("max", "Max ms", 70),
+            ("count", "Count", 60), ("total", "Total ms", 80),
+        ))
+
+        bottom = ttk.Frame(self)
+        bottom.pack(fill=tk.X, padx=5, pady=5)
+
+        ttk.Label(bottom, text="Slow query threshold (ms):").pack(side=tk.LEFT)
+        self.threshold_var = tk.StringVar(value=f"{slow_query_seconds() * 1000:.0f}")
+        threshold = ttk.Spinbox(bottom, from_=1, to=60000, increment=50, width=7,
+                                textvariable=self.threshold_var, command=self.set_threshold)
+        threshold.bind("<Return>", lambda e: self.set_threshold())
+        threshold.pack(side=tk.LEFT, padx=(2, 10))
+
+        self.pool_var = tk.StringVar()
+        ttk.Label(bottom, textvariable=self.pool_var).pack(side=tk.LEFT)
+
+        ttk.Button(bottom, text="Close", command=self.on_close).pack(side=tk.RIGHT)
+        ttk.Button(bottom, text="Reset", command=self.reset).pack(side=tk.RIGHT, padx=5)
+        ttk.Button(bottom, text="Refresh", command=self.refresh).pack(side=tk.RIGHT)
+
+    def add_tab(self, notebook, title, columns):
+        frame = ttk.Frame(notebook)
+        notebook.add(frame, text=title)
+        frame.rowconfigure(0, weight=1)
+        frame.columnconfigure(0, weight=1)
+
+        tree = ttk.Treeview(frame, columns=[c[0] for c in columns], show="headings")
+        for col, heading, width in columns:
+            tree.heading(col, text=heading)
+            tree.column(col, width=width, stretch=col in ("query", "name"))
+        tree.grid(row=0, column=0, sticky="nsew")
+
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        scrollbar.grid(row=0, column=1, sticky="ns")
+        tree.configure(yscrollcommand=scrollbar.set)
+        return tree
+
+    def refresh(self):
+        self.queries_tree.delete(*self.queries_tree.get_children())
+        for r in query_summary():
+            self.queries_tree.insert("", "end", values=(
+                ms(r["p95"]), ms(r["p50"]), ms(r["max"]), r["count"], ms(r["total"]), r["rows"],
+                r["site"], r["query"]))
+
+        self.slow_tree.delete(*self.slow_tree.get_children())
+        for r in slow_queries():
+            self.slow_tree.insert("", "end", values=(
+                datetime.fromtimestamp(r["at"]).strftime("%H:%M:%S"), ms(r["seconds"]), r["rows"],
+                r["site"], r["query"]))
+
+        self.timings_tree.delete(*self.timings_tree.get_children())
+        for r in timing_summary():
+            self.timings_tree.insert("", "end", values=(
+                r["name"], ms(r["p95"]), ms(r["p50"]), ms(r["max"]), r["count"], ms(r["total"])))
+
+        stats = pool_stats()
+        self.pool_var.set(f"Connections: {stats['open']} open, {stats['idle']} idle, "
+                          f"{stats['connections']} opened, {stats['checkouts']} checkouts, "
+                          f"{stats['waits']} waits ({stats['wait_seconds']:.2f} s)")
+
+    def set_threshold(self):
+        try:
+            threshold_ms = float(self.threshold_var.get())
+        except ValueError:
+            return
+        set_slow_query_seconds(threshold_ms / 1000)
+        set_setting("slow_query_ms", f"{threshold_ms:g}")
+
+    def reset(self):
+        reset()
+        self.refresh()
+
+    def on_close(self):
+        save_window_geometry("diagnostics", self.geometry())
+        self.destroy()
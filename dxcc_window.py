@@ -2,6 +2,7 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from window_prefs import load_window_geometry, save_window_geometry
 from config import get_pg_connection
+from query_stats import timed
 import json
 
 def open_dxcc_window(parent=None):
@@ -52,22 +53,21 @@ def open_dxcc_window(parent=None):
 def load_dxcc_data(tree):
     tree.delete(*tree.get_children())
     try:
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT entity_code, name, country_code, prefix, prefix_regex, cq, itu,
-                   notes, outgoing_qsl_service, third_party_traffic, valid_start, valid_end
-            FROM dxcc_codes ORDER BY entity_code
-        """)
-        rows = cursor.fetchall()
-        for row in rows:
-            row = list(row)
-            for i, val in enumerate(row):
-                if hasattr(val, "strftime"):
-                    row[i] = val.strftime("%Y-%m-%d")
-            tree.insert("", "end", values=row)
-        cursor.close()
-        conn.close()
+        with timed("DXCC codes: load"), get_pg_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT entity_code, name, country_code, prefix, prefix_regex, cq, itu,
+                       notes, outgoing_qsl_service, third_party_traffic, valid_start, valid_end
+                FROM dxcc_codes ORDER BY entity_code
+            """)
+            rows = cursor.fetchall()
+            for row in rows:
+                row = list(row)
+                for i, val in enumerate(row):
+                    if hasattr(val, "strftime"):
+                        row[i] = val.strftime("%Y-%m-%d")
+                tree.insert("", "end", values=row)
+            cursor.close()
     except Exception as e:
         messagebox.showerror("Error", f"Error loading DXCC data: {e}")
 
@@ -83,35 +83,34 @@ def import_dxcc_data(tree):
         with open(file_path, "r", encoding="utf-8") as f:
             data = json.load(f)
 
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM dxcc_codes")
-
-        for item in data:
-            cursor.execute("""
-                INSERT INTO dxcc_codes (
-                    entity_code, name, country_code, prefix, prefix_regex,
-                    cq, itu, notes, outgoing_qsl_service, third_party_traffic,
-                    valid_start, valid_end
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                item.get("entityCode"),
-                item.get("name") or item.get("country"),
-                item.get("countryCode"),
-                item.get("prefix"),
-                item.get("prefixRegex"),
-                item.get("cq"),
-                item.get("itu"),
-                item.get("notes"),
-                item.get("outgoingQslService"),
-                item.get("thirdPartyTraffic"),
-                item.get("validStart"),
-                item.get("validEnd")
-            ))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with get_pg_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM dxcc_codes")
+
+            for item in data:
+                cursor.execute("""
+                    INSERT INTO dxcc_codes (
+                        entity_code, name, country_code, prefix, prefix_regex,
+                        cq, itu, notes, outgoing_qsl_service, third_party_traffic,
+                        valid_start, valid_end
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    item.get("entityCode"),
+                    item.get("name") or item.get("country"),
+                    item.get("countryCode"),
+                    item.get("prefix"),
+                    item.get("prefixRegex"),
+                    item.get("cq"),
+                    item.get("itu"),
+                    item.get("notes"),
+                    item.get("outgoingQslService"),
+                    item.get("thirdPartyTraffic"),
+                    item.get("validStart"),
+                    item.get("validEnd")
+                ))
+
+            conn.commit()
+            cursor.close()
 
         load_dxcc_data(tree)
         messagebox.showinfo("Success", "DXCC codes imported successfully.")
@@ -120,5 +119,5 @@ def import_dxcc_data(tree):
         messagebox.showerror("Import Error", f"Failed to import DXCC data:\n{e}")
 
 def on_close(window):
-    save_window_geometry(window, "dxcc")
+    save_window_geometry("dxcc", window.geometry())
     window.destroy()
\ No newline at end of file
@@ -3,6 +3,7 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from window_prefs import load_window_geometry, save_window_geometry
 from config import get_pg_connection
+from query_stats import timed
 
 def open_itu_window(parent=None):
     window = tk.Toplevel(parent)
@@ -49,17 +50,16 @@ def open_itu_window(parent=None):
 def load_itu_data(tree):
     tree.delete(*tree.get_children())
     try:
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT code, name, fifa, itu, ioc, id, continent, a2, a3
-            FROM itu_codes ORDER BY code
-        """)
-        rows = cursor.fetchall()
-        for row in rows:
-            tree.insert("", "end", values=row)
-        cursor.close()
-        conn.close()
+        with timed("ITU codes: load"), get_pg_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT code, name, fifa, itu, ioc, id, continent, a2, a3
+                FROM itu_codes ORDER BY code
+            """)
+            rows = cursor.fetchall()
+            for row in rows:
+                tree.insert("", "end", values=row)
+            cursor.close()
     except Exception as e:
         messagebox.showerror("Error", f"Error loading ITU codes: {e}")
 
@@ -76,24 +76,23 @@ def import_itu_data(tree):
         with open(file_path, "r", encoding="utf-8") as f:
             data = json.load(f)
 
-        conn = get_pg_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM itu_codes")
+        with get_pg_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM itu_codes")
 
-        for item in data:
-            cursor.execute("""
-                INSERT INTO itu_codes (
-                    code, name, fifa, itu, ioc, id, continent, a2, a3
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                item.get("code"), item.get("name"), item.get("fifa"),
-                item.get("itu"), item.get("ioc"), item.get("id"),
-                item.get("continent"), item.get("a2"), item.get("a3")
-            ))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+            for item in data:
+                cursor.execute("""
+                    INSERT INTO itu_codes (
+                        code, name, fifa, itu, ioc, id, continent, a2, a3
+                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (
+                    item.get("code"), item.get("name"), item.get("fifa"),
+                    item.get("itu"), item.get("ioc"), item.get("id"),
+                    item.get("continent"), item.get("a2"), item.get("a3")
+                ))
+
+            conn.commit()
+            cursor.close()
 
         load_itu_data(tree)
         messagebox.showinfo("Success", "ITU codes data imported successfully.")
@@ -102,5 +101,5 @@ def import_itu_data(tree):
         messagebox.showerror("Import Error", f"Failed to import ITU data:\n{e}")
 
 def on_close(window):
-    save_window_geometry(window, "itu")
+    save_window_geometry("itu", window.geometry())
     window.destroy()
@@ -0,0 +1,190 @@
+"""The main window of HamData2; main.py starts it."""
+
+import threading
+import tkinter as tk
+from queue import Empty, Queue
+from tkinter import ttk, messagebox
+from config import get_pool
+from query_stats import SLOW_QUERY_SECONDS, set_slow_query_seconds
+from settings_store import flush_settings
+from thumbnail_cache import thumbnail_path
+from window_prefs import save_window_geometry
+
+DEFAULT_GEOMETRY = "1024x768"
+# Milliseconds between checks for the results of the startup worker
+STARTUP_POLL_MS = 50
+
+
+def geometry_size(geometry):
+    """Return (width, height) of a "WxH+X+Y" geometry string."""
+    size = geometry.split("+")[0].split("-")[0]
+    width, height = size.split("x")
+    return int(width), int(height)
+
+
+class MainWindow(tk.Tk):
+    """The main window; shown at once, with settings and the background loaded by a worker thread."""
+
+    def __init__(self, profile=None):
+        super().__init__()
+        self.profile = profile
+        self.title("HamData2")
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.geometry(DEFAULT_GEOMETRY)
+
+        self.create_menubar()
+        self.bg_label = None
+        self.mark("window created")
+        self.bind("<Map>", self.on_first_map)
+
+        self.startup_events = Queue()
+        threading.Thread(target=self.load_startup, daemon=True).start()
+        self.after(STARTUP_POLL_MS, self.poll_startup)
+
+    def mark(self, name):
+        if self.profile is not None:
+            self.profile.mark(name)
+
+    def on_first_map(self, event):
+        if event.widget is self:
+            self.unbind("<Map>")
+            self.after_idle(self.mark, "first frame")
+
+    def load_startup(self):
+        """Worker thread: migrate, read the settings and prepare the background image."""
+        events = self.startup_events
+        try:
+            from migrations import migrate
+            migrate()
+        except Exception as e:
+            print(f"Schema migration failed: {e}")
+        try:
+            from settings_store import get_setting
+            settings = {
+                "geometry": get_setting("main_geometry", ""),
+                "slow_query_ms": get_setting("slow_query_ms", SLOW_QUERY_SECONDS * 1000),
+                "background_image": get_setting("background_image"),
+            }
+        except Exception as e:
+            print(f"Loading settings failed: {e}")
+            events.put(("done", None))
+            return
+        events.put(("settings", settings))
+
+        if settings["background_image"]:
+            try:
+                width, height = geometry_size(settings["geometry"] or DEFAULT_GEOMETRY)
+                events.put(("background", thumbnail_path(settings["background_image"], width, height)))
+            except Exception as e:
+                print(f"Background image loading failed: {e}")
+        events.put(("done", None))
+
+    def poll_startup(self):
+        while True:
+            try:
+                kind, value = self.startup_events.get_nowait()
+            except Empty:
+                self.after(STARTUP_POLL_MS, self.poll_startup)
+                return
+            if kind == "settings":
+                self.apply_settings(value)
+            elif kind == "background":
+                self.show_background(value)
+            elif kind == "done":
+                self.startup_done()
+                return
+
+    def apply_settings(self, settings):
+        try:
+            set_slow_query_seconds(float(settings["slow_query_ms"]) / 1000)
+        except (TypeError, ValueError) as e:
+            print(f"Invalid slow_query_ms setting: {e}")
+        if settings["geometry"]:
+            self.geometry(settings["geometry"])
+        self.mark("settings loaded")
+
+    def show_background(self, path):
+        try:
+            bg = tk.PhotoImage(file=path)
+        except tk.TclError as e:
+            print(f"Background image loading failed: {e}")
+            return
+        self.bg_label = tk.Label(self, image=bg)
+        self.bg_label.image = bg
+        self.bg_label.place(relx=0.5, rely=0.5, anchor=tk.CENTER)
+        self.bg_label.lower()
+        self.mark("background shown")
+
+    def startup_done(self):
+        if self.profile is not None:
+            self.update_idletasks()
+            self.mark("startup done")
+            self.profile.stop()
+            self.profile.report()
+
+    def create_menubar(self):
+        menubar = tk.Menu(self)
+
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Import ADIF File...", command=self.import_adif_file)
+        file_menu.add_command(label="Import ADIF Folder...", command=self.import_adif_folder)
+        file_menu.add_separator()
+        file_menu.add_command(label="Exit", command=self.on_close)
+        menubar.add_cascade(label="File", menu=file_menu)
+
+        view_menu = tk.Menu(menubar, tearoff=0)
+        view_menu.add_command(label="QSOs", command=self.open_qso_window)
+        view_menu.add_command(label="Callsigns", command=self.open_callsigns_window)
+        view_menu.add_command(label="DXCC Codes", command=self.open_dxcc_window)
+        view_menu.add_command(label="ITU Codes", command=self.open_itu_window)
+        menubar.add_cascade(label="View", menu=view_menu)
+
+        settings_menu = tk.Menu(menubar, tearoff=0)
+        settings_menu.add_command(label="General Settings", command=self.open_settings_window)
+        menubar.add_cascade(label="Settings", menu=settings_menu)
+
+        diagnostics_menu = tk.Menu(menubar, tearoff=0)
+        diagnostics_menu.add_command(label="Query and Load Timings...", command=self.open_diagnostics_window)
+        menubar.add_cascade(label="Diagnostics", menu=diagnostics_menu)
+
+        self.config(menu=menubar)
+
+    def on_close(self):
+        save_window_geometry("main", self.geometry())
+        if messagebox.askokcancel("Quit", "Do you really want to quit?"):
+            self.destroy()
+            flush_settings()
+            get_pool().closeall()
+
+    def import_adif_file(self):
+        from adi_import import choose_and_import_adi_file
+        choose_and_import_adi_file(self)
+
+    def import_adif_folder(self):
+        from adi_import import import_adif_folder
+        import_adif_folder(self)
+
+    def open_qso_window(self):
+        from qsos_window import open_qsos_window
+        open_qsos_window(self)
+
+    def open_callsigns_window(self):
+        from callsigns_window import open_callsigns_window
+        open_callsigns_window(self)
+
+    def open_dxcc_window(self):
+        from dxcc_window import open_dxcc_window
+        open_dxcc_window(self)
+
+    def open_itu_window(self):
+        from itu_window import open_itu_window
+        open_itu_window(self)
+
+    def open_diagnostics_window(self):
+        from diagnostics_window import open_diagnostics_window
+        open_diagnostics_window(self)
+
+    def open_settings_window(self):
+        from settings_window import SettingsWindow
+        win = SettingsWindow(self)
+        win.grab_set()
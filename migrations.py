@@ -0,0 +1,405 @@
+"""Versioned schema migrations for the HamData database.
+
+    python -m migrations            apply the pending migrations
+    python -m migrations --list     show applied and pending migrations
+    python -m migrations --check    EXPLAIN the hot queries, exit 1 on a seq scan
+
+Every migration is a (version, description, statements) entry of MIGRATIONS
+and is applied once, in its own transaction, and recorded in
+schema_migrations. New migrations are appended with the next version number;
+applied ones are never edited. A migration listed in REQUIREMENTS waits,
+pending, until the server has what it needs, e.g. the pg_trgm extension;
+the migrations after it are applied meanwhile. migrate() runs at startup and
+before imports and costs one query when nothing is pending, plus one per
+waiting migration.
+
+--check runs EXPLAIN on each query of hot_queries() and fails if a plan
+sequentially scans a table with more than LARGE_TABLE_ROWS rows, i.e. an index
+the query depends on is missing or unusable.
+"""
+
+import argparse
+import json
+import sys
+from datetime import date, time
+from config import get_pg_connection
+
+MIGRATION_TABLE = "schema_migrations"
+
+# Any number; keeps two processes from applying the same migration at once
+MIGRATION_LOCK_ID = 5_271_013
+
+MIGRATIONS = [
+    (1, "newest-first ordering of the QSO list", [
+        "CREATE INDEX IF NOT EXISTS qsos_date_time_idx ON qsos (qso_date DESC, time_on DESC)",
+    ]),
+    (2, "duplicate lookup of the importer", [
+        "CREATE INDEX IF NOT EXISTS qsos_dedup_idx ON qsos (operator_id, call_id, freq, qso_date)",
+    ]),
+    # pg_trgm ships with PostgreSQL's contrib package, which some installs lack;
+    # see REQUIREMENTS
+    (3, "pg_trgm extension for substring searches", [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    ]),
+    (4, "trigram indexes for the callsign and name filters", [
+        "CREATE INDEX IF NOT EXISTS qsos_raw_call_trgm_idx ON qsos USING gin (raw_call gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS qsos_raw_operator_trgm_idx ON qsos USING gin (raw_operator gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS callsigns_callsign_trgm_idx ON callsigns USING gin (callsign gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS callsigns_wholename_trgm_idx ON callsigns USING gin (wholename gin_trgm_ops)",
+    ]),
+    (5, "keyset paging of the QSO list", [
+        "CREATE INDEX IF NOT EXISTS qsos_keyset_idx ON qsos (qso_date DESC, time_on DESC, id DESC)",
+        "DROP INDEX IF EXISTS qsos_date_time_idx",
+    ]),
+    # statement-level triggers with transition tables: one UPDATE per statement, COPY included
+    (6, "trigger-maintained row counts of qsos and callsigns", [
+        "LOCK TABLE qsos, callsigns IN SHARE ROW EXCLUSIVE MODE",
+        "CREATE TABLE IF NOT EXISTS row_counts (table_name TEXT PRIMARY KEY, row_count BIGINT NOT NULL)",
+        """CREATE OR REPLACE FUNCTION row_counts_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               UPDATE row_counts SET row_count = row_count + (SELECT count(*) FROM new_rows)
+               WHERE table_name = TG_TABLE_NAME;
+               RETURN NULL;
+           END $$""",
+        """CREATE OR REPLACE FUNCTION row_counts_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               UPDATE row_counts SET row_count = row_count - (SELECT count(*) FROM old_rows)
+               WHERE table_name = TG_TABLE_NAME;
+               RETURN NULL;
+           END $$""",
+        """CREATE OR REPLACE FUNCTION row_counts_truncate() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               UPDATE row_counts SET row_count = 0 WHERE table_name = TG_TABLE_NAME;
+               RETURN NULL;
+           END $$""",
+        *[statement for table in ("qsos", "callsigns") for statement in (
+            f"""INSERT INTO row_counts (table_name, row_count) SELECT '{table}', count(*) FROM {table}
+                ON CONFLICT (table_name) DO UPDATE SET row_count = EXCLUDED.row_count""",
+            f"""CREATE TRIGGER {table}_count_insert AFTER INSERT ON {table}
+                REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE row_counts_insert()""",
+            f"""CREATE TRIGGER {table}_count_delete AFTER DELETE ON {table}
+                REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE row_counts_delete()""",
+            f"""CREATE TRIGGER {table}_count_truncate AFTER TRUNCATE ON {table}
+                FOR EACH STATEMENT EXECUTE PROCEDURE row_counts_truncate()""",
+        )],
+    ]),
+    # one index per sortable column of the QSO and callsign lists; b-trees are read either way
+    (7, "indexes for sorting the QSO and callsign lists", [
+        "CREATE INDEX IF NOT EXISTS qsos_time_on_idx ON qsos (time_on, id)",
+        "CREATE INDEX IF NOT EXISTS qsos_raw_call_idx ON qsos ((COALESCE(raw_call, '')), id)",
+        "CREATE INDEX IF NOT EXISTS qsos_freq_idx ON qsos (freq, id)",
+        "CREATE INDEX IF NOT EXISTS qsos_mode_idx ON qsos (mode, id)",
+        "CREATE INDEX IF NOT EXISTS qsos_raw_operator_idx ON qsos ((COALESCE(raw_operator, '')), id)",
+        "CREATE INDEX IF NOT EXISTS callsigns_wholename_idx ON callsigns (wholename, callsign)",
+    ]),
+    # band is stored so the band filter can use an index; each filter index is
+    # followed by the list's default order, so a filtered first page reads one range
+    (8, "band column and indexes for the QSO filter language", [
+        """ALTER TABLE qsos ADD COLUMN IF NOT EXISTS band VARCHAR(8) GENERATED ALWAYS AS (
+            CASE
+                WHEN freq BETWEEN 0.1357 AND 0.1378 THEN '2190m'
+                WHEN freq BETWEEN 0.472 AND 0.479 THEN '630m'
+                WHEN freq BETWEEN 1.8 AND 2.0 THEN '160m'
+                WHEN freq BETWEEN 3.5 AND 4.0 THEN '80m'
+                WHEN freq BETWEEN 5.06 AND 5.45 THEN '60m'
+                WHEN freq BETWEEN 7.0 AND 7.3 THEN '40m'
+                WHEN freq BETWEEN 10.1 AND 10.15 THEN '30m'
+                WHEN freq BETWEEN 14.0 AND 14.35 THEN '20m'
+                WHEN freq BETWEEN 18.068 AND 18.168 THEN '17m'
+                WHEN freq BETWEEN 21.0 AND 21.45 THEN '15m'
+                WHEN freq BETWEEN 24.89 AND 24.99 THEN '12m'
+                WHEN freq BETWEEN 28.0 AND 29.7 THEN '10m'
+                WHEN freq BETWEEN 50.0 AND 54.0 THEN '6m'
+                WHEN freq BETWEEN 70.0 AND 71.0 THEN '4m'
+                WHEN freq BETWEEN 144.0 AND 148.0 THEN '2m'
+                WHEN freq BETWEEN 222.0 AND 225.0 THEN '1.25m'
+                WHEN freq BETWEEN 420.0 AND 450.0 THEN '70cm'
+                WHEN freq BETWEEN 1240.0 AND 1300.0 THEN '23cm'
+            END) STORED""",
+        "CREATE INDEX IF NOT EXISTS qsos_band_idx ON qsos (band, qso_date DESC, time_on DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS qsos_mode_date_idx ON qsos (mode, qso_date DESC, time_on DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS qsos_dxcc_idx ON qsos (dxcc, qso_date DESC, time_on DESC, id DESC)",
+        "CREATE INDEX IF NOT EXISTS qsos_gridsquare_idx ON qsos ((UPPER(gridsquare)) text_pattern_ops)",
+    ]),
+    # callsign filters resolved through the callsign index become call_id lists
+    (9, "call_id index for callsign filters", [
+        "CREATE INDEX IF NOT EXISTS qsos_call_id_idx ON qsos (call_id, qso_date DESC, time_on DESC, id DESC)",
+    ]),
+    # one row per callsign with QSOs; the triggers aggregate each INSERT statement
+    # (an import's insert included) into one upsert, and recount the callsigns
+    # whose QSOs were updated or deleted
+    (10, "per-callsign QSO summary", [
+        "LOCK TABLE qsos IN SHARE ROW EXCLUSIVE MODE",
+        """CREATE TABLE IF NOT EXISTS callsign_stats (
+               call_id BIGINT PRIMARY KEY REFERENCES callsigns (id) ON DELETE CASCADE,
+               qso_count INTEGER NOT NULL,
+               bands INTEGER NOT NULL,
+               modes INTEGER NOT NULL,
+               first_qso TIMESTAMP NOT NULL,
+               last_qso TIMESTAMP NOT NULL,
+               best_snr SMALLINT,
+               max_distance NUMERIC(10, 2)
+           )""",
+        """CREATE OR REPLACE FUNCTION qso_band_bit(band TEXT) RETURNS INTEGER
+           LANGUAGE sql IMMUTABLE AS $$
+               SELECT COALESCE(1 << (array_position(ARRAY[
+                   '2190m', '630m', '160m', '80m', '60m', '40m', '30m', '20m', '17m', '15m', '12m', '10m',
+                   '6m', '4m', '2m', '1.25m', '70cm', '23cm']::text[], band) - 1), 0)
+           $$""",
+        # modes outside the list share bit 30
+        """CREATE OR REPLACE FUNCTION qso_mode_bit(mode TEXT) RETURNS INTEGER
+           LANGUAGE sql IMMUTABLE AS $$
+               SELECT CASE WHEN mode IS NULL THEN 0 ELSE COALESCE(1 << (array_position(
+                   ARRAY['CW', 'SSB', 'AM', 'FM', 'RTTY', 'PSK', 'FT8', 'FT4', 'JT65', 'JT9', 'JS8', 'MFSK',
+                         'OLIVIA', 'SSTV', 'WSPR', 'Q65', 'MSK144', 'DIGITALVOICE', 'HELL', 'CONTESTI', 'PKT'
+                   ]::text[], upper(mode)) - 1), 1 << 30) END
+           $$""",
+        """CREATE OR REPLACE FUNCTION callsign_stats_recount(ids BIGINT[]) RETURNS void
+           LANGUAGE sql AS $$
+               DELETE FROM callsign_stats WHERE call_id = ANY(ids);
+               INSERT INTO callsign_stats
+               SELECT call_id, count(*), bit_or(qso_band_bit(band)), bit_or(qso_mode_bit(mode)),
+                      min(qso_date + time_on), max(qso_date + time_on), max(app_pskrep_snr), max(distance)
+               FROM qsos WHERE call_id = ANY(ids) GROUP BY call_id;
+           $$""",
+        """CREATE OR REPLACE FUNCTION callsign_stats_insert() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               INSERT INTO callsign_stats
+               SELECT call_id, count(*), bit_or(qso_band_bit(band)), bit_or(qso_mode_bit(mode)),
+                      min(qso_date + time_on), max(qso_date + time_on), max(app_pskrep_snr), max(distance)
+               FROM new_rows WHERE call_id IS NOT NULL GROUP BY call_id
+               ON CONFLICT (call_id) DO UPDATE SET
+                   qso_count = callsign_stats.qso_count + EXCLUDED.qso_count,
+                   bands = callsign_stats.bands | EXCLUDED.bands,
+                   modes = callsign_stats.modes | EXCLUDED.modes,
+                   first_qso = LEAST(callsign_stats.first_qso, EXCLUDED.first_qso),
+                   last_qso = GREATEST(callsign_stats.last_qso, EXCLUDED.last_qso),
+                   best_snr = GREATEST(callsign_stats.best_snr, EXCLUDED.best_snr),
+                   max_distance = GREATEST(callsign_stats.max_distance, EXCLUDED.max_distance);
+               RETURN NULL;
+           END $$""",
+        """CREATE OR REPLACE FUNCTION callsign_stats_update() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               -- e.g. the importer's qso_complete updates change nothing counted here
+               PERFORM callsign_stats_recount(ARRAY(
+                   SELECT unnest(ARRAY[o.call_id, n.call_id])
+                   FROM old_rows o JOIN new_rows n ON n.id = o.id
+                   WHERE (o.call_id, o.band, o.mode, o.qso_date, o.time_on, o.app_pskrep_snr, o.distance)
+                         IS DISTINCT FROM
+                         (n.call_id, n.band, n.mode, n.qso_date, n.time_on, n.app_pskrep_snr, n.distance)));
+               RETURN NULL;
+           END $$""",
+        """CREATE OR REPLACE FUNCTION callsign_stats_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               PERFORM callsign_stats_recount(ARRAY(SELECT DISTINCT call_id FROM old_rows));
+               RETURN NULL;
+           END $$""",
+        """CREATE OR REPLACE FUNCTION callsign_stats_truncate() RETURNS trigger LANGUAGE plpgsql AS $$
+           BEGIN
+               DELETE FROM callsign_stats;
+               RETURN NULL;
+           END $$""",
+        """INSERT INTO callsign_stats
+           SELECT call_id, count(*), bit_or(qso_band_bit(band)), bit_or(qso_mode_bit(mode)),
+                      min(qso_date + time_on), max(qso_date + time_on), max(app_pskrep_snr), max(distance)
+               FROM qsos WHERE call_id IS NOT NULL GROUP BY call_id
+           ON CONFLICT (call_id) DO NOTHING""",
+        """CREATE TRIGGER qsos_stats_insert AFTER INSERT ON qsos
+           REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE PROCEDURE callsign_stats_insert()""",
+        """CREATE TRIGGER qsos_stats_update AFTER UPDATE ON qsos
+           REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+           FOR EACH STATEMENT EXECUTE PROCEDURE callsign_stats_update()""",
+        """CREATE TRIGGER qsos_stats_delete AFTER DELETE ON qsos
+           REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE PROCEDURE callsign_stats_delete()""",
+        """CREATE TRIGGER qsos_stats_truncate AFTER TRUNCATE ON qsos
+           FOR EACH STATEMENT EXECUTE PROCEDURE callsign_stats_truncate()""",
+    ]),
+    # imports before this stored 0 for a QSO without an SNR report, which made
+    # every callsign with a CW or SSB QSO show "best SNR 0 dB". Every import
+    # migrates first, so the rows this finds all predate the importer storing
+    # NULL; a real 0 dB report among them cannot be told apart and goes too.
+    # The update trigger of migration 10 recounts the callsigns concerned.
+    (11, "no SNR instead of 0 dB on QSOs of earlier imports", [
+        "UPDATE qsos SET app_pskrep_snr = NULL WHERE app_pskrep_snr = 0",
+    ]),
+]
+
+PG_TRGM_AVAILABLE = ("pg_trgm", "SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm')")
+
+# version -> (what is missing, query returning true once it is there) of the
+# migrations that need something the server may lack; they stay pending,
+# without holding up later migrations, until the query returns true
+REQUIREMENTS = {
+    3: PG_TRGM_AVAILABLE,
+    4: PG_TRGM_AVAILABLE,
+}
+
+# Tables with fewer rows may be scanned; the planner prefers that for small tables
+LARGE_TABLE_ROWS = 10000
+
+# (name, query, parameters) as the windows and the importer run them
+def hot_queries():
+    """Return (name, query, params) of the queries the windows and the importer run most.
+
+    The queries come from the builders the application itself uses, with
+    sample values, so --check explains exactly the SQL that runs. The window
+    modules import tkinter, hence the imports here rather than at the top.
+    """
+    from callsign_stats import recent_qsos_sql
+    from callsigns_detail import DETAIL_SQL
+    from callsigns_window import callsign_list_sql
+    from qso_dedup import PRELOAD_SQL
+    from qsos_window import filter_sql, qso_page_sql
+
+    def qso_page(filter_text, my_call=None, call_ids=None, **page):
+        where, params = filter_sql(filter_text, my_call, call_ids)
+        return qso_page_sql(where, params, **page)
+
+    key = (date(2020, 1, 1), time(12, 0), 1000)
+    return [
+        ("QSO list", *qso_page("")),
+        ("QSO list, older page", *qso_page("", key=key)),
+        ("QSO list, newer page", *qso_page("", forward=False, key=key)),
+        ("QSO list, callsign filter", *qso_page("OH3")),
+        ("QSO list, only my QSOs", *qso_page("", my_call="OH3AA")),
+        ("QSO list, callsign ids", *qso_page("call:OH3AA", call_ids=lambda value: [1, 2, 3])),
+        ("QSO list, band and mode filter", *qso_page("band:20m mode:FT8")),
+        ("QSO list, date range filter", *qso_page("date:2024-01..2024-03")),
+        ("QSO list, dxcc filter", *qso_page("dxcc:224")),
+        ("QSO list, gridsquare filter", *qso_page("grid:KP2*")),
+        ("QSO list, sorted by callsign", *qso_page("", sort_column="raw_call", sort_descending=False,
+                                                   key=("OH3AA", 1000))),
+        ("QSO list, sorted by frequency", *qso_page("", sort_column="freq")),
+        ("callsign list, filter", *callsign_list_sql("OH3")),
+        ("callsign detail", DETAIL_SQL, ("OH3AA",)),
+        ("callsign detail, QSO page", *recent_qsos_sql(1, key)),
+        ("import date preload", PRELOAD_SQL, ([date(2024, 1, 1), date(2024, 1, 2)],)),
+    ]
+
+_migrated = False
+
+
+def create_migration_table(cur):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MIGRATION_TABLE} (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def applied_versions(conn):
+    with conn.cursor() as cur:
+        create_migration_table(cur)
+        cur.execute(f"SELECT version FROM {MIGRATION_TABLE}")
+        versions = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return versions
+
+
+def requirement_met(conn, version):
+    requirement = REQUIREMENTS.get(version)
+    if requirement is None:
+        return True
+    with conn.cursor() as cur:
+        cur.execute(requirement[1])
+        met = cur.fetchone()[0]
+    conn.commit()
+    return met
+
+
+def migrate(force=False):
+    """Apply the pending migrations; returns the versions applied.
+
+    Checks the database only once per process unless *force* is set.
+    """
+    global _migrated
+    if _migrated and not force:
+        return []
+    applied = []
+    with get_pg_connection() as conn:
+        done = applied_versions(conn)
+        for version, description, statements in MIGRATIONS:
+            if version in done or not requirement_met(conn, version):
+                continue
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+                cur.execute(f"SELECT 1 FROM {MIGRATION_TABLE} WHERE version = %s", (version,))
+                if cur.fetchone() is None:
+                    for statement in statements:
+                        cur.execute(statement)
+                    cur.execute(f"INSERT INTO {MIGRATION_TABLE} (version, description) VALUES (%s, %s)",
+                                (version, description))
+                    applied.append(version)
+            conn.commit()
+    _migrated = True
+    return applied
+
+
+def seq_scans(plan):
+    """Yield the relation names of the Seq Scan nodes of an EXPLAIN (FORMAT JSON) plan."""
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child)
+
+
+def check_queries():
+    """EXPLAIN every hot query; returns a list of (name, problem) for the failing ones."""
+    problems = []
+    with get_pg_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE qsos")
+            cur.execute("ANALYZE callsigns")
+            cur.execute("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")
+            rows = dict(cur.fetchall())
+            for name, query, params in hot_queries():
+                cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+                plan = cur.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                for table in seq_scans(plan[0]["Plan"]):
+                    if rows.get(table, 0) > LARGE_TABLE_ROWS:
+                        problems.append((name, f"sequential scan of {table} ({rows[table]:.0f} rows)"))
+        conn.rollback()
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="Migrate the HamData schema.")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--list", action="store_true", help="show applied and pending migrations")
+    group.add_argument("--check", action="store_true",
+                       help="EXPLAIN the hot queries and fail if one scans a large table sequentially")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        with get_pg_connection() as conn:
+            done = applied_versions(conn)
+            for version, description, _ in MIGRATIONS:
+                if version in done:
+                    status = "applied"
+                elif requirement_met(conn, version):
+                    status = "pending"
+                else:
+                    status = "waiting"
+                    description += f" (needs {REQUIREMENTS[version][0]})"
+                print(f"{version:4} {status:8} {description}")
+        return 0
+
+    if args.check:
+        problems = check_queries()
+        for name, problem in problems:
+            print(f"{name}: {problem}")
+        if not problems:
+            print(f"{len(hot_queries())} queries checked, no sequential scans of large tables")
+        return 1 if problems else 0
+
+    applied = migrate(force=True)
+    print(f"applied migrations {', '.join(map(str, applied))}" if applied else "schema is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
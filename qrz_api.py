@@ -1,9 +1,17 @@
 
-import requests
-
+import threading
+import time
 import xml.etree.ElementTree as ET
-import psycopg2
-from config import DB_SETTINGS
+from callsign_index import refresh_callsign
+from config import get_pg_connection
+from settings_store import get_setting, set_setting
+
+QRZ_URL = "https://xmldata.qrz.com/xml/current/"
+QRZ_AGENT = "HAMDataApp"
+# Seconds until a session key is logged in again even if QRZ has not rejected it
+SESSION_LIFETIME_SECONDS = 24 * 3600
+# Seconds a request to QRZ may take
+REQUEST_TIMEOUT = 15
 
 
 def get_qrz_credentials():
@@ -11,15 +19,8 @@ def get_qrz_credentials():
 
     Raises ValueError if either credential is missing.
     """
-    with psycopg2.connect(**DB_SETTINGS) as conn:
-        with conn.cursor() as cur:
-            cur.execute("SELECT value FROM gen_settings WHERE key = 'qrz_username'")
-            row_user = cur.fetchone()
-            cur.execute("SELECT value FROM gen_settings WHERE key = 'qrz_password'")
-            row_pass = cur.fetchone()
-
-    username = row_user[0].strip() if row_user and row_user[0] else None
-    password = row_pass[0].strip() if row_pass and row_pass[0] else None
+    username = (get_setting('qrz_username') or '').strip() or None
+    password = (get_setting('qrz_password') or '').strip() or None
 
     if not username or not password:
         raise ValueError("QRZ credentials not found in gen_settings (keys 'qrz_username'/'qrz_password').")
@@ -27,67 +28,154 @@ def get_qrz_credentials():
     return username, password
 
 
+class QrzError(Exception):
+    """An error reported by the QRZ XML API, or a response it could not be read from."""
+
+
+def parse_response(content):
+    """Parse a QRZ XML response, dropping the namespace from the tags."""
+    root = ET.fromstring(content)
+    for element in root.iter():
+        if isinstance(element.tag, str) and "}" in element.tag:
+            element.tag = element.tag.split("}", 1)[1]
+    return root
+
+
+class QrzClient:
+    """Client of the QRZ XML API that keeps its session key and HTTP connection.
+
+    The session key is kept in memory and in gen_settings with the time it is
+    assumed to expire, so neither lookups nor restarts log in again while it
+    is valid. One requests.Session carries all requests, reusing its
+    keep-alive connection. A response without a session key means QRZ no
+    longer accepts it; the client then logs in once and repeats the request.
+    """
+
+    def __init__(self, url=QRZ_URL, timeout=REQUEST_TIMEOUT):
+        self.url = url
+        self.timeout = timeout
+        self.key = None
+        self.expires = 0.0
+        self._http = None
+        self._lock = threading.Lock()
+
+    def _get(self, params):
+        if self._http is None:
+            import requests
+            self._http = requests.Session()
+        response = self._http.get(self.url, params=params, timeout=self.timeout)
+        response.raise_for_status()
+        return parse_response(response.content)
+
+    def session_key(self):
+        """Return a session key that is not known to have expired, logging in if there is none."""
+        with self._lock:
+            if self.key and time.time() < self.expires:
+                return self.key
+            username, _ = get_qrz_credentials()
+            key = get_setting("qrz_session_key")
+            expires = float(get_setting("qrz_session_expires") or 0)
+            if key and get_setting("qrz_session_user") == username and time.time() < expires:
+                self.key, self.expires = key, expires
+                return key
+            return self._login()
+
+    def _login(self):
+        username, password = get_qrz_credentials()
+        root = self._get({"username": username, "password": password, "agent": QRZ_AGENT})
+        key = root.findtext("Session/Key")
+        if not key:
+            error_text = root.findtext("Session/Error") or root.findtext(".//Error")
+            raise QrzError(f"QRZ login failed: {error_text or 'Unknown response'}")
+        self.key, self.expires = key, time.time() + SESSION_LIFETIME_SECONDS
+        set_setting("qrz_session_key", key)
+        set_setting("qrz_session_expires", str(int(self.expires)))
+        set_setting("qrz_session_user", username)
+        return key
+
+    def login(self):
+        """Log in even if a session key is cached; returns the new key."""
+        with self._lock:
+            return self._login()
+
+    def request(self, **params):
+        """Send a request with the session key; logs in again once if QRZ rejects the key."""
+        key = self.session_key()
+        root = self._get({"s": key, **params})
+        if root.findtext("Session/Key"):
+            return root
+        with self._lock:
+            # another thread may have replaced the key meanwhile
+            if self.key == key:
+                self.key, self.expires = None, 0.0
+                set_setting("qrz_session_expires", "0")
+        root = self._get({"s": self.session_key(), **params})
+        if not root.findtext("Session/Key"):
+            error_text = root.findtext("Session/Error") or "Unknown response"
+            raise QrzError(f"QRZ request failed: {error_text}")
+        return root
+
+    def lookup(self, callsign):
+        """Return the fields of *callsign* that are stored in the callsigns table."""
+        root = self.request(callsign=callsign)
+        call_data = root.find("Callsign")
+        if call_data is None:
+            error_text = root.findtext("Session/Error")
+            raise QrzError(error_text or "No data found for this callsign")
+
+        def get(tag):
+            return call_data.findtext(tag, '').strip()
+
+        return {
+            'aliases': get('aliases'),
+            'dxcc': int(get('dxcc') or 0),
+            'qslinfo': get('qslmgr'),
+            'wholename': get('name'),
+            'bornyear': int(get('born') or 0),
+            'addr1': get('addr1'),
+            'addr2': get('addr2'),
+            'state': get('state'),
+            'zip': get('zip'),
+            'country': get('country'),
+            'lat': float(get('lat') or 0),
+            'lon': float(get('lon') or 0),
+            'grid': get('grid'),
+        }
+
+
+_client = None
+
+
+def get_qrz_client():
+    """The shared client, so its session key and connection outlive a single lookup."""
+    global _client
+    if _client is None:
+        _client = QrzClient()
+    return _client
+
+
 def qrz_login():
-    username, password = get_qrz_credentials()
-    url = f"https://xmldata.qrz.com/xml/current/?username={username};password={password};agent=HAMDataApp"
-    response = requests.get(url)
-    root = ET.fromstring(response.content)
-    # Try to capture error message anywhere in the XML
-    error_text = root.findtext('Session/Error') or root.findtext('Error') or root.findtext('.//Error')
-    session = root.findtext('Session/key')
-    if not session:
-        if error_text:
-            raise Exception(f'QRZ login failed: {error_text}')
-        else:
-            raise Exception('QRZ login failed: Unknown response')
-        error = root.findtext('Session/Error') or "Unknown error"
-        raise Exception(f"QRZ login failed: {error}")
-    return session
+    return get_qrz_client().login()
+
+
 def qrz_lookup(callsign):
-    session = qrz_login()
-    url = f"https://xmldata.qrz.com/xml/current/?s={session};callsign={callsign}"
-    response = requests.get(url)
-    root = ET.fromstring(response.content)
-    call_data = root.find('Callsign')
-    if call_data is None:
-        raise Exception("No data found for this callsign")
-
-    def get(tag):
-        return call_data.findtext(tag, '').strip()
-
-    return {
-        'aliases': get('aliases'),
-        'dxcc': int(get('dxcc') or 0),
-        'qslinfo': get('qslmgr'),
-        'wholename': get('name'),
-        'bornyear': int(get('born') or 0),
-        'addr1': get('addr1'),
-        'addr2': get('addr2'),
-        'state': get('state'),
-        'zip': get('zip'),
-        'country': get('country'),
-        'lat': float(get('lat') or 0),
-        'lon': float(get('lon') or 0),
-        'grid': get('grid'),
-    }
+    return get_qrz_client().lookup(callsign)
 
-def update_callsign_in_db(callsign, data):
-    conn = psycopg2.connect(**DB_SETTINGS)
-    cur = conn.cursor()
 
+def update_callsign_in_db(callsign, data):
     updates = ', '.join([f"{key} = %s" for key in data.keys()])
     values = list(data.values())
     values.append(callsign)
 
-    cur.execute(f"""
-        UPDATE callsigns
-        SET {updates}, qrzupdate = now()
-        WHERE callsign = %s
-    """, values)
-
-    conn.commit()
-    cur.close()
-    conn.close()
+    with get_pg_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                UPDATE callsigns
+                SET {updates}, qrzupdate = now()
+                WHERE callsign = %s
+            """, values)
+        conn.commit()
+    refresh_callsign(callsign)
 
 
 def update_callsign_from_qrz(callsign):
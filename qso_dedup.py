@@ -0,0 +1,187 @@
+"""In-memory duplicate detection for QSO imports.
+
+Two QSOs are duplicates when operator, call, frequency and date are equal and
+their times are at most DUP_WINDOW_SECONDS apart. DedupIndex buckets QSO keys
+by (operator_id, call_id, freq, qso_date) and keeps each bucket sorted by
+time_on, so the window check is a bisect instead of a query per record.
+Existing QSOs are loaded per date with one query for all dates of a batch,
+and every QSO accepted during the import is added as well, so duplicates
+inside the same file are caught before anything is written.
+"""
+
+from bisect import bisect_left, bisect_right
+import psycopg2
+from psycopg2.extras import execute_values
+
+DUP_WINDOW_SECONDS = 180
+
+# Existing QSOs of a list of dates
+PRELOAD_SQL = """
+    SELECT id, operator_id, call_id, freq, qso_date, time_on, qso_complete FROM qsos
+    WHERE qso_date = ANY(%s) AND operator_id IS NOT NULL AND call_id IS NOT NULL
+"""
+
+
+def qso_key(operator_id, call_id, freq, qso_date):
+    # qsos.freq is numeric(10,6): compare file floats and database Decimals at that precision
+    return operator_id, call_id, round(float(freq), 6), qso_date
+
+
+def seconds_of(time_on):
+    return time_on.hour * 3600 + time_on.minute * 60 + time_on.second
+
+
+class DedupIndex:
+    """Keys of existing and newly imported QSOs.
+
+    Each bucket is a pair of parallel lists (times, entries) sorted by time;
+    an entry is [id, qso_complete], id being None until the QSO is inserted.
+    Changes made by check() are journaled so that undo() can take them back
+    when the write they were made for is rolled back.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.loaded_dates = set()
+        self.journal = []
+
+    def mark(self):
+        return len(self.journal)
+
+    def undo(self, mark):
+        """Revert the changes made by check() since *mark*."""
+        while len(self.journal) > mark:
+            change = self.journal.pop()
+            if change[0] == "set":
+                _, entry, value = change
+                entry[1] = value
+            else:
+                _, times, entries, i = change
+                del times[i]
+                del entries[i]
+
+    def forget(self):
+        """Drop the journal once the checked QSOs are written."""
+        self.journal.clear()
+
+    def load(self, conn, dates):
+        """Load the existing QSOs of those *dates* that are not loaded yet."""
+        dates = set(dates) - self.loaded_dates
+        if not dates:
+            return
+        loaded = {}
+        with conn.cursor() as cur:
+            cur.execute(PRELOAD_SQL, (sorted(dates),))
+            for id_, operator_id, call_id, freq, qso_date, time_on, qso_complete in cur:
+                key = qso_key(operator_id, call_id, freq, qso_date)
+                loaded.setdefault(key, []).append((seconds_of(time_on), id_, [id_, qso_complete]))
+        for key, rows in loaded.items():
+            rows.sort()
+            self.buckets[key] = ([row[0] for row in rows], [row[2] for row in rows])
+        self.loaded_dates |= dates
+
+    def check(self, qso):
+        """Classify *qso* like the per-record duplicate query did.
+
+        Returns ("imported", entry) for a new QSO, which is added to the index
+        (entry is None if a callsign is missing, as such QSOs never match), or
+        ("updated" | "ignored", entry) for a duplicate, where "updated" means its
+        qso_complete beat the matched entry's and was copied into it.
+        """
+        if qso["operator_id"] is None or qso["call_id"] is None:
+            return "imported", None
+
+        key = qso_key(qso["operator_id"], qso["call_id"], qso["freq"], qso["qso_date"])
+        seconds = seconds_of(qso["time_on"])
+        times, entries = self.buckets.setdefault(key, ([], []))
+
+        i = bisect_left(times, seconds - DUP_WINDOW_SECONDS)
+        if i < len(times) and times[i] <= seconds + DUP_WINDOW_SECONDS:
+            entry = entries[i]
+            if qso["qso_complete"] > (entry[1] or ''):
+                self.journal.append(("set", entry, entry[1]))
+                entry[1] = qso["qso_complete"]
+                return "updated", entry
+            return "ignored", entry
+
+        entry = [None, qso["qso_complete"]]
+        i = bisect_right(times, seconds)
+        times.insert(i, seconds)
+        entries.insert(i, entry)
+        self.journal.append(("add", times, entries, i))
+        return "imported", entry
+
+
+def write_batch(conn, index, qsos, columns):
+    """Deduplicate *qsos* against *index* and write the result.
+
+    New QSOs go in with one multi-row INSERT, upgraded qso_complete values of
+    QSOs already in the database with one UPDATE. Returns the
+    imported/updated/ignored counts. Does not commit; if the write fails the
+    caller is expected to roll back and undo() the index.
+    """
+    counts = {"imported": 0, "updated": 0, "ignored": 0}
+    new = []
+    upgrades = {}
+    for qso in qsos:
+        outcome, entry = index.check(qso)
+        counts[outcome] += 1
+        if outcome == "imported":
+            new.append((entry, qso))
+        elif outcome == "updated" and entry[0] is not None:
+            upgrades[entry[0]] = entry
+
+    with conn.cursor() as cur:
+        if new:
+            # an entry upgraded later in this batch carries its final value into the INSERT
+            rows = [tuple(entry[1] if entry and col == "qso_complete" else qso[col] for col in columns)
+                    for entry, qso in new]
+            ids = execute_values(cur, f"INSERT INTO qsos ({', '.join(columns)}) VALUES %s RETURNING id",
+                                 rows, page_size=len(rows), fetch=True)
+            for (entry, _), (id_,) in zip(new, ids):
+                if entry:
+                    entry[0] = id_
+        if upgrades:
+            execute_values(cur, """
+                UPDATE qsos q SET qso_complete = v.qso_complete
+                FROM (VALUES %s) AS v(id, qso_complete) WHERE q.id = v.id
+            """, [(id_, entry[1]) for id_, entry in upgrades.items()], page_size=len(upgrades))
+    return counts
+
+
+def write_isolated(conn, index, qsos, fields, columns, rejects, resolver=None):
+    """write_batch() inside a savepoint, isolating QSOs the database refuses.
+
+    If the batch fails it is rolled back to the savepoint and split in halves,
+    recursively, until every failing QSO is on its own; those are appended to
+    *rejects* as (fields, reason) and the rest is written. *fields* are the
+    ADIF records the *qsos* came from. With *resolver* (a CallsignResolver)
+    the callsigns are resolved inside the savepoint as well, so a callsign
+    that cannot be stored rejects its QSO instead of failing the import.
+    Values psycopg2 refuses to send (ValueError) are isolated like errors of
+    the database. Returns the counts plus "rejected".
+    """
+    mark = index.mark()
+    resolver_mark = resolver.mark() if resolver is not None else None
+    with conn.cursor() as cur:
+        cur.execute("SAVEPOINT import_batch")
+        try:
+            if resolver is not None:
+                resolver.resolve(qsos)
+            counts = write_batch(conn, index, qsos, columns)
+        except (psycopg2.Error, ValueError) as e:
+            cur.execute("ROLLBACK TO SAVEPOINT import_batch")
+            cur.execute("RELEASE SAVEPOINT import_batch")
+            index.undo(mark)
+            if resolver is not None:
+                resolver.undo(resolver_mark)
+            if len(qsos) == 1:
+                rejects.append((fields[0], (str(e).strip().splitlines() or [type(e).__name__])[0]))
+                return {"imported": 0, "updated": 0, "ignored": 0, "rejected": 1}
+            mid = len(qsos) // 2
+            first = write_isolated(conn, index, qsos[:mid], fields[:mid], columns, rejects, resolver)
+            second = write_isolated(conn, index, qsos[mid:], fields[mid:], columns, rejects, resolver)
+            return {key: first[key] + second[key] for key in first}
+        cur.execute("RELEASE SAVEPOINT import_batch")
+    counts["rejected"] = 0
+    return counts
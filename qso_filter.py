@@ -0,0 +1,139 @@
+"""Filter language of the QSO list.
+
+A filter is a list of terms separated by spaces; all terms must match:
+
+    OH3AA            callsign contains OH3AA (bare words, as before)
+    call:OH3*        callsign pattern; * matches anything, no * means "contains"
+    op:OH3AA         operator callsign, same rules as call:
+    band:20m,40m     band, derived from the frequency
+    mode:FT8,FT4     mode
+    date:2024-01..2024-03
+                     QSO date: a year, month or day, or a range of them with ..;
+                     either end of the range may be left out
+    dxcc:224,291     DXCC entity number
+    grid:KP2*        gridsquare; no * means "starts with"
+
+Lists of values separated by commas match any of them. parse_filter() turns a
+filter into SQL conditions with parameters; every condition is written so it
+can use one of the indexes of migrations 8 and 9. With *call_ids*, callsign
+terms are looked up in the callsign index first and become a call_id list.
+"""
+
+from datetime import date
+
+# ADIF band names and their frequency ranges in MHz, as in migration 8
+BANDS = (
+    ("2190m", 0.1357, 0.1378), ("630m", 0.472, 0.479), ("160m", 1.8, 2.0), ("80m", 3.5, 4.0),
+    ("60m", 5.06, 5.45), ("40m", 7.0, 7.3), ("30m", 10.1, 10.15), ("20m", 14.0, 14.35),
+    ("17m", 18.068, 18.168), ("15m", 21.0, 21.45), ("12m", 24.89, 24.99), ("10m", 28.0, 29.7),
+    ("6m", 50.0, 54.0), ("4m", 70.0, 71.0), ("2m", 144.0, 148.0), ("1.25m", 222.0, 225.0),
+    ("70cm", 420.0, 450.0), ("23cm", 1240.0, 1300.0),
+)
+BAND_NAMES = {name for name, _, _ in BANDS}
+
+
+class FilterError(ValueError):
+    """Raised for a filter that cannot be parsed; the message is meant for the user."""
+
+
+def like_pattern(value, contains):
+    """Turn a value with * wildcards into a LIKE pattern.
+
+    Without a * the pattern matches values that contain *value*, or start
+    with it unless *contains* is set.
+    """
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    if "*" in escaped:
+        return escaped.replace("*", "%")
+    return f"%{escaped}%" if contains else f"{escaped}%"
+
+
+def parse_date(text, end=False):
+    """Return the first day of a YYYY, YYYY-MM or YYYY-MM-DD period, or the day after it with *end*."""
+    try:
+        parts = [int(p) for p in text.split("-")]
+        if len(parts) == 1:
+            day = date(parts[0], 1, 1)
+            return date(parts[0] + 1, 1, 1) if end else day
+        if len(parts) == 2:
+            day = date(parts[0], parts[1], 1)
+            if not end:
+                return day
+            return date(parts[0] + 1, 1, 1) if parts[1] == 12 else date(parts[0], parts[1] + 1, 1)
+        if len(parts) == 3:
+            day = date(*parts)
+            return date.fromordinal(day.toordinal() + 1) if end else day
+    except ValueError:
+        pass
+    raise FilterError(f"Invalid date {text!r}; use YYYY, YYYY-MM or YYYY-MM-DD")
+
+
+def date_condition(value):
+    first, sep, last = value.partition("..")
+    if not sep:
+        last = first
+    conditions, params = [], []
+    if first:
+        conditions.append("qso_date >= %s")
+        params.append(parse_date(first))
+    if last:
+        conditions.append("qso_date < %s")
+        params.append(parse_date(last, end=True))
+    if not conditions:
+        raise FilterError("date: needs a date or a range")
+    return " AND ".join(conditions), params
+
+
+def values_of(key, value):
+    values = [v for v in value.split(",") if v]
+    if not values:
+        raise FilterError(f"{key}: needs a value")
+    return values
+
+
+def term_condition(key, value, call_ids=None):
+    """Return (condition, params) of one key:value term."""
+    if key == "call" and call_ids is not None:
+        ids = call_ids(value)
+        if ids is not None:
+            return "call_id = ANY(%s)", [ids]
+    if key == "call" or key == "op":
+        column = "raw_call" if key == "call" else "raw_operator"
+        return f"{column} ILIKE %s", [like_pattern(value, contains=True)]
+    if key == "band":
+        bands = [v.lower() for v in values_of(key, value)]
+        unknown = [b for b in bands if b not in BAND_NAMES]
+        if unknown:
+            raise FilterError(f"Unknown band {unknown[0]!r}")
+        return "band = ANY(%s)", [bands]
+    if key == "mode":
+        return "mode = ANY(%s)", [[v.upper() for v in values_of(key, value)]]
+    if key == "dxcc":
+        try:
+            return "dxcc = ANY(%s)", [[int(v) for v in values_of(key, value)]]
+        except ValueError:
+            raise FilterError(f"dxcc: needs entity numbers, not {value!r}") from None
+    if key == "grid":
+        return "UPPER(gridsquare) LIKE %s", [like_pattern(value.upper(), contains=False)]
+    if key == "date":
+        return date_condition(value)
+    raise FilterError(f"Unknown filter {key}:; use call, op, band, mode, date, dxcc or grid")
+
+
+def parse_filter(text, call_ids=None):
+    """Return (conditions, params) of filter *text*; raises FilterError if it is invalid.
+
+    call_ids(value) returns the ids of the callsigns a call: term matches, or
+    None if it cannot tell; the term is then matched against raw_call.
+    """
+    conditions, params = [], []
+    for term in text.split():
+        key, sep, value = term.partition(":")
+        if not sep:
+            key, value = "call", term
+        if not value:
+            raise FilterError(f"{key}: needs a value")
+        condition, condition_params = term_condition(key.lower(), value, call_ids)
+        conditions.append(condition)
+        params.extend(condition_params)
+    return conditions, params
@@ -0,0 +1,675 @@
+"""ADIF import engine: record conversion, callsign resolution and bulk loading.
+
+Has no Tk dependency so it can run in worker processes and from scripts;
+adi_import.py builds the dialogs on top of it.
+"""
+
+import hashlib
+import math
+import os
+import re
+import sys
+import time
+import psycopg2
+from psycopg2.extras import execute_values
+from datetime import date, datetime, time as time_of_day
+from config import get_pg_connection
+from migrations import migrate
+from adif_reader import format_adif_record, read_adif
+from qso_dedup import DUP_WINDOW_SECONDS, DedupIndex, qso_key, seconds_of, write_isolated
+
+ADIF_FILE_TABLE = "imported_adif_files"
+RESOLVE_BATCH_SIZE = 1000
+STAGING_TABLE = "adif_staging"
+LINK_TABLE = "adif_staging_links"
+
+# Bytes at the start of a file hashed to notice that it was replaced
+PREFIX_HASH_BYTES = 65536
+
+# Columns written to qsos, in COPY order (operator_id/call_id are resolved separately)
+QSO_COLUMNS = (
+    "freq", "app_pskrep_brg", "distance", "mode", "operator_id", "call_id",
+    "my_gridsquare", "qso_date", "time_on", "app_pskrep_snr", "raw_operator", "raw_call",
+    "country", "dxcc", "gridsquare", "qso_complete", "swl",
+)
+
+# varchar limits of qsos; longer values would make COPY fail for the whole file
+QSO_VARCHAR_LIMITS = {
+    "mode": 10, "my_gridsquare": 12, "raw_operator": 20, "raw_call": 20,
+    "country": 64, "gridsquare": 12, "qso_complete": 10,
+}
+
+# Exclusive magnitude limits of the numeric columns (numeric(p,s), integer, smallint)
+QSO_NUMERIC_LIMITS = {
+    "freq": 10 ** 4, "distance": 10 ** 8, "app_pskrep_brg": 2 ** 31,
+    "dxcc": 2 ** 31, "app_pskrep_snr": 2 ** 15,
+}
+
+# Batches written between commits on the non-COPY path
+COMMIT_EVERY_BATCHES = 20
+
+# Normalize callsign (e.g. OH0/OH3AA/M -> OH3AA)
+def normalize_callsign(call):
+    match = re.search(r"([A-Z0-9]+)$", call.replace("/", ""))
+    return match.group(1) if match else call
+
+def connect_db():
+    return get_pg_connection()
+
+def create_tables():
+    """Apply the pending migrations and create the import bookkeeping table.
+
+    Returns the exception the migrations failed with, or None. The import
+    works without them, only slower, so reporting the failure or stopping is
+    left to the caller.
+    """
+    migration_error = None
+    try:
+        migrate()
+    except Exception as e:
+        migration_error = e
+    with connect_db() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f'''
+                CREATE TABLE IF NOT EXISTS {ADIF_FILE_TABLE} (
+                    filename TEXT PRIMARY KEY,
+                    imported_at TIMESTAMP NOT NULL
+                );
+            ''')
+            # File identity and the end of the last imported record, for tail imports
+            cur.execute(f'''
+                ALTER TABLE {ADIF_FILE_TABLE}
+                    ADD COLUMN IF NOT EXISTS file_size BIGINT,
+                    ADD COLUMN IF NOT EXISTS file_mtime DOUBLE PRECISION,
+                    ADD COLUMN IF NOT EXISTS prefix_hash TEXT,
+                    ADD COLUMN IF NOT EXISTS byte_offset BIGINT;
+            ''')
+            conn.commit()
+    return migration_error
+
+def parse_adif_date(text):
+    """ADIF date (YYYYMMDD) -> date; strptime only for values not in that exact form."""
+    if len(text) == 8 and text.isascii() and text.isdigit():
+        return date(int(text[:4]), int(text[4:6]), int(text[6:]))
+    return datetime.strptime(text, "%Y%m%d").date()
+
+def parse_adif_time(text):
+    """ADIF time (HHMMSS) -> time; strptime only for values not in that exact form."""
+    if len(text) == 6 and text.isascii() and text.isdigit():
+        return time_of_day(int(text[:2]), int(text[2:4]), int(text[4:]))
+    return datetime.strptime(text, "%H%M%S").time()
+
+def record_to_qso(fields):
+    """Convert parsed ADIF fields to qsos column values (without operator_id/call_id).
+
+    Raises ValueError if a numeric or date field cannot be converted.
+    """
+    return {
+        "freq": float(fields.get("FREQ", 0)),
+        "app_pskrep_brg": int(fields.get("APP_PSKREP_BRG", 0)),
+        "distance": float(fields.get("DISTANCE", 0)),
+        "mode": fields.get("MODE", "").upper() or "UNKNOWN",
+        "raw_operator": fields.get("OPERATOR", ""),
+        "raw_call": fields.get("CALL", ""),
+        "my_gridsquare": fields.get("MY_GRIDSQUARE", ""),
+        "qso_date": parse_adif_date(fields.get("QSO_DATE", "19700101")),
+        "time_on": parse_adif_time(fields.get("TIME_ON", "000000")),
+        # None, not 0, without an SNR report: 0 dB is a real SNR
+        "app_pskrep_snr": int(fields["APP_PSKREP_SNR"]) if fields.get("APP_PSKREP_SNR") else None,
+        "country": fields.get("COUNTRY", ""),
+        "dxcc": int(fields.get("DXCC", 0)),
+        "gridsquare": fields.get("GRIDSQUARE", ""),
+        "qso_complete": fields.get("QSO_COMPLETE", "1"),
+        "swl": fields.get("SWL", "0") in ("1", "Y", "y", "true", "True"),
+    }
+
+def check_qso_values(qso):
+    """Raise ValueError for values the qsos columns cannot hold."""
+    # the varchar columns are all the text of a QSO
+    for col, limit in QSO_VARCHAR_LIMITS.items():
+        value = qso[col]
+        if value is None:
+            continue
+        if len(value) > limit:
+            raise ValueError(f"{col} longer than {limit} characters")
+        # PostgreSQL text cannot hold NUL; psycopg2 refuses such strings before sending them
+        if "\0" in value:
+            raise ValueError(f"{col} contains a NUL character")
+    for col, limit in QSO_NUMERIC_LIMITS.items():
+        if qso[col] is not None and (not math.isfinite(qso[col]) or abs(qso[col]) >= limit):
+            raise ValueError(f"{col} out of range: {qso[col]}")
+
+class CallsignResolver:
+    """Import-scoped callsign -> id map working on the import connection.
+
+    Known callsigns are loaded once (or looked up per batch when *preload* is
+    off), new ones are inserted in batches with INSERT ... ON CONFLICT, and
+    firstseen/lastseen are written once per callsign by flush() from the
+    earliest and latest QSO date seen during the import.
+    """
+
+    def __init__(self, conn, preload=True):
+        self.conn = conn
+        self.preloaded = preload
+        self.ids = {}
+        self.seen = {}
+        # changes since mark(), taken back by undo() when their savepoint is
+        # rolled back; None while nothing is marked
+        self.journal = None
+        if preload:
+            with conn.cursor() as cur:
+                cur.execute("SELECT callsign, id FROM callsigns")
+                self.ids.update(cur)
+
+    def resolve(self, qsos):
+        """Set operator_id/call_id of *qsos* from their raw_operator/raw_call."""
+        names = []
+        for qso in qsos:
+            operator = normalize_callsign(qso["raw_operator"]) if qso["raw_operator"] else None
+            call = normalize_callsign(qso["raw_call"]) if qso["raw_call"] else None
+            names.append((operator, call))
+
+        missing = {name for pair in names for name in pair if name and name not in self.ids}
+        if missing:
+            self._load(missing)
+
+        for qso, (operator, call) in zip(qsos, names):
+            qso["operator_id"] = self._note(operator, qso["qso_date"])
+            qso["call_id"] = self._note(call, qso["qso_date"])
+
+    def mark(self):
+        """Start journaling changes, for undo(), if not started yet; returns the current position."""
+        if self.journal is None:
+            self.journal = []
+        return len(self.journal)
+
+    def undo(self, mark):
+        """Revert the changes made by resolve() since *mark*."""
+        while len(self.journal) > mark:
+            change = self.journal.pop()
+            if change[0] == "id":
+                self.ids.pop(change[1], None)
+            elif change[0] == "seen":
+                self.seen.pop(change[1], None)
+            else:
+                _, first_last, old = change
+                first_last[:] = old
+
+    def forget(self):
+        """Drop the journal once the resolved QSOs are written."""
+        self.journal = None
+
+    def _log(self, change):
+        if self.journal is not None:
+            self.journal.append(change)
+
+    def _note(self, name, qso_date):
+        if not name:
+            return None
+        id_ = self.ids[name]
+        first_last = self.seen.get(id_)
+        if first_last is None:
+            self.seen[id_] = [qso_date, qso_date]
+            self._log(("seen", id_))
+        elif qso_date < first_last[0] or qso_date > first_last[1]:
+            self._log(("range", first_last, list(first_last)))
+            first_last[0] = min(first_last[0], qso_date)
+            first_last[1] = max(first_last[1], qso_date)
+        return id_
+
+    def _load(self, names):
+        with self.conn.cursor() as cur:
+            if not self.preloaded:
+                cur.execute("SELECT callsign, id FROM callsigns WHERE callsign = ANY(%s)", (list(names),))
+                self.ids.update(cur.fetchall())
+                names = [name for name in names if name not in self.ids]
+                if not names:
+                    return
+            # DO UPDATE so RETURNING also reports rows inserted concurrently
+            rows = execute_values(cur, """
+                INSERT INTO callsigns (callsign) VALUES %s
+                ON CONFLICT (callsign) DO UPDATE SET callsign = EXCLUDED.callsign
+                RETURNING callsign, id
+            """, [(name,) for name in names], page_size=RESOLVE_BATCH_SIZE, fetch=True)
+            self.ids.update(rows)
+            for name, _ in rows:
+                self._log(("id", name))
+
+    def flush(self):
+        """Widen firstseen/lastseen of every callsign seen since the last flush."""
+        if not self.seen:
+            return
+        with self.conn.cursor() as cur:
+            execute_values(cur, """
+                UPDATE callsigns c SET
+                    firstseen = LEAST(c.firstseen, v.firstseen),
+                    lastseen = GREATEST(c.lastseen, v.lastseen)
+                FROM (VALUES %s) AS v(id, firstseen, lastseen)
+                WHERE c.id = v.id
+            """, [(id_, first, last) for id_, (first, last) in self.seen.items()], page_size=RESOLVE_BATCH_SIZE)
+        self.seen.clear()
+
+# ---------- File bookkeeping ----------
+def prefix_hash(file_path, length):
+    """SHA-1 of the first min(*length*, PREFIX_HASH_BYTES) bytes of the file."""
+    with open(file_path, "rb") as f:
+        return hashlib.sha1(f.read(min(length, PREFIX_HASH_BYTES))).hexdigest()
+
+def plan_file_import(conn, file_path):
+    """Decide how much of *file_path* has to be imported.
+
+    Returns (status, offset, imported_at), status being one of
+      "new"       never imported; read from offset 0
+      "current"   imported and unchanged since (or imported before offsets were kept)
+      "appended"  grown since the last import; read from offset
+      "changed"   truncated or replaced; read from offset 0
+    """
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT imported_at, file_size, file_mtime, prefix_hash, byte_offset
+            FROM {ADIF_FILE_TABLE} WHERE filename = %s
+        """, (os.path.basename(file_path),))
+        row = cur.fetchone()
+    if not row:
+        return "new", 0, None
+
+    imported_at, size, mtime, digest, offset = row
+    if offset is None:
+        return "current", 0, imported_at
+    stat = os.stat(file_path)
+    if stat.st_size < offset or prefix_hash(file_path, offset) != digest:
+        return "changed", 0, imported_at
+    if stat.st_size == size and stat.st_mtime == mtime:
+        return "current", offset, imported_at
+    return "appended", offset, imported_at
+
+def mark_file_imported(conn, file_path, offset, stat, complete=True):
+    """Record *file_path* as imported up to byte *offset*.
+
+    *stat* is the os.stat() taken before reading, so records appended while
+    the import ran are picked up by the next one. An incomplete (cancelled)
+    import stores no size/mtime, so the next import resumes at *offset*.
+    """
+    size, mtime = (stat.st_size, stat.st_mtime) if complete else (None, None)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            INSERT INTO {ADIF_FILE_TABLE} (filename, imported_at, file_size, file_mtime, prefix_hash, byte_offset)
+            VALUES (%s, now(), %s, %s, %s, %s)
+            ON CONFLICT (filename) DO UPDATE SET
+                imported_at = EXCLUDED.imported_at, file_size = EXCLUDED.file_size,
+                file_mtime = EXCLUDED.file_mtime, prefix_hash = EXCLUDED.prefix_hash,
+                byte_offset = EXCLUDED.byte_offset
+        """, (os.path.basename(file_path), size, mtime, prefix_hash(file_path, offset), offset))
+
+def rejects_path(file_path):
+    """Sidecar file for rejected records: log.adi -> log.rejects.adi."""
+    return os.path.splitext(file_path)[0] + ".rejects.adi"
+
+def write_rejects(file_path, rejects, append=False):
+    """Write (fields, reason) *rejects* to the sidecar of *file_path*.
+
+    Without *append* (a full import) the sidecar is replaced, or removed when
+    there is nothing to reject; tail imports add to it.
+    """
+    path = rejects_path(file_path)
+    if not rejects:
+        if not append and os.path.exists(path):
+            os.remove(path)
+        return
+    new_file = not append or not os.path.exists(path)
+    with open(path, "wb" if new_file else "ab") as f:
+        if new_file:
+            f.write(f"Records rejected while importing {os.path.basename(file_path)}\n<EOH>\n".encode("utf-8"))
+        for fields, reason in rejects:
+            f.write(format_adif_record(dict(fields, REJECT_REASON=reason)))
+
+def parse_qsos(file_path, offset=0):
+    """Read and convert the records of an ADIF file from byte *offset* on.
+
+    Returns (qsos, rejects, end_offset, stat): rejects are (fields, reason)
+    pairs for records that could not be converted, end_offset the end of the
+    last complete record (or *offset* if there was none) and stat the
+    os.stat() taken before reading.
+    """
+    qsos = []
+    rejects = []
+    end_offset = offset
+    stat = os.stat(file_path)
+    with open(file_path, "rb") as f:
+        f.seek(offset)
+        for fields, end_offset in read_adif(f, with_offsets=True):
+            try:
+                qso = record_to_qso(fields)
+                check_qso_values(qso)
+            except ValueError as e:
+                rejects.append((fields, str(e)))
+                continue
+            qsos.append(qso)
+    return qsos, rejects, end_offset, stat
+
+# ---------- Bulk load ----------
+def copy_value(value):
+    """Format a Python value for COPY ... FROM STDIN text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+def copy_line(row):
+    """Format a row as one line of COPY ... FROM STDIN text format."""
+    # Most rows need no escaping: join them as they are, with NUL standing in
+    # for NULL, and format value by value only when the line shows a character
+    # that must be escaped, or a NUL of a value
+    line = "\t".join(["\0" if value is None else str(value) for value in row])
+    if ("\\" in line or "\n" in line or "\r" in line or line.count("\t") != len(row) - 1
+            or line.count("\0") != row.count(None)):
+        return "\t".join(copy_value(value) for value in row) + "\n"
+    return line.replace("\0", "\\N") + "\n"
+
+class CopyStream:
+    """File-like object that feeds rows to cursor.copy_expert() one line at a time."""
+
+    def __init__(self, rows):
+        self._lines = map(copy_line, rows)
+        self._buffer = ""
+
+    def read(self, size=-1):
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        while size < 0 or length < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            chunks.append(line)
+            length += len(line)
+        data = "".join(chunks)
+        if size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+def copy_rows(cur, table, columns, rows):
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", CopyStream(rows))
+
+def find_file_duplicates(keys, matched):
+    """Pair QSOs of one file with an earlier QSO of the same file they duplicate.
+
+    *keys* is a list of (seq, key, seconds) in file order, where key is
+    (operator_id, call_id, freq, qso_date) or None when a callsign is missing.
+    QSOs whose seq is in *matched* already duplicate a QSO in the database and
+    are never inserted, so they cannot be duplicated themselves.
+
+    Returns a list of (seq, leader_seq).
+    """
+    leaders = {}
+    links = []
+    for seq, key, seconds in keys:
+        if key is None or seq in matched:
+            continue
+        bucket = leaders.setdefault(key, [])
+        for leader_seconds, leader_seq in bucket:
+            if abs(leader_seconds - seconds) <= DUP_WINDOW_SECONDS:
+                links.append((seq, leader_seq))
+                break
+        else:
+            bucket.append((seconds, seq))
+    return links
+
+def bulk_load_qsos(conn, qsos):
+    """Load *qsos* (dicts keyed by QSO_COLUMNS) through a COPY-fed staging table.
+
+    Gives the same result as checking and inserting row by row: a QSO that matches
+    an existing QSO, or an earlier QSO of the same batch, within DUP_WINDOW_SECONDS
+    is not inserted, and upgrades the qso_complete of the QSO it matches if its own
+    value is greater. Does not commit.
+
+    Returns (imported, updated, duplicates_ignored).
+    """
+    keys = []
+
+    def staged_rows():
+        for seq, qso in enumerate(qsos):
+            if qso["operator_id"] is None or qso["call_id"] is None:
+                key = None
+            else:
+                # the same key as the batched path: freq at the precision of qsos.freq
+                key = qso_key(qso["operator_id"], qso["call_id"], qso["freq"], qso["qso_date"])
+            keys.append((seq, key, seconds_of(qso["time_on"])))
+            yield (seq,) + tuple(qso[col] for col in QSO_COLUMNS)
+
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            CREATE TEMP TABLE {STAGING_TABLE} (
+                seq integer PRIMARY KEY,
+                freq numeric(10,6) NOT NULL,
+                app_pskrep_brg integer,
+                distance numeric(10,2),
+                mode varchar(10) NOT NULL,
+                operator_id bigint,
+                call_id bigint,
+                my_gridsquare varchar(12),
+                qso_date date NOT NULL,
+                time_on time NOT NULL,
+                app_pskrep_snr smallint,
+                raw_operator varchar(20),
+                raw_call varchar(20),
+                country varchar(64),
+                dxcc integer,
+                gridsquare varchar(12),
+                qso_complete varchar(10),
+                swl boolean,
+                dup_id bigint,
+                leader_seq integer
+            ) ON COMMIT DROP
+        """)
+        copy_rows(cur, STAGING_TABLE, ("seq",) + QSO_COLUMNS, staged_rows())
+        cur.execute(f"ANALYZE {STAGING_TABLE}")
+
+        # Duplicates of QSOs already in the database
+        cur.execute(f"""
+            UPDATE {STAGING_TABLE} s SET dup_id = m.id
+            FROM {STAGING_TABLE} s2
+            CROSS JOIN LATERAL (
+                SELECT q.id FROM qsos q
+                WHERE q.operator_id = s2.operator_id AND q.call_id = s2.call_id AND q.freq = s2.freq
+                AND q.qso_date = s2.qso_date
+                AND ABS(EXTRACT(EPOCH FROM (q.time_on - s2.time_on))) <= %s
+                ORDER BY q.id LIMIT 1
+            ) m
+            WHERE s.seq = s2.seq
+        """, (DUP_WINDOW_SECONDS,))
+        cur.execute(f"SELECT seq FROM {STAGING_TABLE} WHERE dup_id IS NOT NULL")
+        matched = {row[0] for row in cur.fetchall()}
+
+        # Duplicates of QSOs earlier in the same file
+        links = find_file_duplicates(keys, matched)
+        if links:
+            cur.execute(f"CREATE TEMP TABLE {LINK_TABLE} (seq integer, leader_seq integer) ON COMMIT DROP")
+            copy_rows(cur, LINK_TABLE, ("seq", "leader_seq"), links)
+            cur.execute(f"""
+                UPDATE {STAGING_TABLE} s SET leader_seq = l.leader_seq
+                FROM {LINK_TABLE} l WHERE l.seq = s.seq
+            """)
+
+        # A duplicate counts as an update when its qso_complete beats the target's
+        # value as left by the duplicates before it
+        cur.execute(f"""
+            SELECT COUNT(*),
+                   COUNT(*) FILTER (WHERE d.qso_complete > GREATEST(d.base, COALESCE(d.prev_max, '')))
+            FROM (
+                SELECT COALESCE(s.qso_complete, '') COLLATE "C" AS qso_complete,
+                       COALESCE(q.qso_complete, l.qso_complete, '') COLLATE "C" AS base,
+                       MAX(COALESCE(s.qso_complete, '') COLLATE "C") OVER (
+                           PARTITION BY s.dup_id, s.leader_seq ORDER BY s.seq
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                       ) AS prev_max
+                FROM {STAGING_TABLE} s
+                LEFT JOIN qsos q ON q.id = s.dup_id
+                LEFT JOIN {STAGING_TABLE} l ON l.seq = s.leader_seq
+                WHERE s.dup_id IS NOT NULL OR s.leader_seq IS NOT NULL
+            ) d
+        """)
+        duplicates, updated = cur.fetchone()
+
+        cur.execute(f"""
+            UPDATE qsos q SET qso_complete = u.best
+            FROM (
+                SELECT dup_id, MAX(COALESCE(qso_complete, '') COLLATE "C") AS best
+                FROM {STAGING_TABLE} WHERE dup_id IS NOT NULL GROUP BY dup_id
+            ) u
+            WHERE q.id = u.dup_id AND u.best > COALESCE(q.qso_complete, '') COLLATE "C"
+        """)
+        cur.execute(f"""
+            UPDATE {STAGING_TABLE} s SET qso_complete = u.best
+            FROM (
+                SELECT leader_seq, MAX(COALESCE(qso_complete, '') COLLATE "C") AS best
+                FROM {STAGING_TABLE} WHERE leader_seq IS NOT NULL GROUP BY leader_seq
+            ) u
+            WHERE s.seq = u.leader_seq AND u.best > COALESCE(s.qso_complete, '') COLLATE "C"
+        """)
+
+        columns = ", ".join(QSO_COLUMNS)
+        cur.execute(f"""
+            INSERT INTO qsos ({columns})
+            SELECT {columns} FROM {STAGING_TABLE}
+            WHERE dup_id IS NULL AND leader_seq IS NULL
+            ORDER BY seq
+        """)
+        imported = cur.rowcount
+
+    return imported, updated, duplicates - updated
+
+# ---------- Import ----------
+def import_file(file_path, offset=0, bulk=False, progress=None, cancel=None):
+    """Import the records of *file_path* from byte *offset* on and commit.
+
+    With *bulk* the records go through bulk_load_qsos() in one transaction;
+    otherwise duplicates are resolved in memory by qso_dedup, each batch is
+    written with one INSERT and one UPDATE inside a savepoint, and the work is
+    committed every COMMIT_EVERY_BATCHES batches. COPY cannot leave out a row
+    the database refuses, so if the bulk load fails it is rolled back and the
+    file is imported again the batched way. Records that cannot be converted
+    or that the database refuses are rejected: they are counted as rejected,
+    not ignored, and written with their reason to the file's .rejects.adi
+    sidecar. "ignored" counts only the duplicates left out.
+
+    *progress* is called with a copy of the counts after every
+    RESOLVE_BATCH_SIZE records. With *bulk* the imported/updated/ignored
+    counts are only known once the load is done, so they stay 0 until then; once *cancel* (a threading.Event) is set the
+    import stops at the next batch boundary, keeps the batches done so far and
+    records the file as partially imported.
+
+    Returns a dict with the records/imported/updated/ignored/rejected counts,
+    the "rejects_file" written (or None), the file "position" reached, whether
+    the import was "cancelled", and the wall-clock "seconds" split into
+    "parse_seconds" (reading and converting records) and "db_seconds"
+    (everything else).
+    """
+    started = time.perf_counter()
+    if bulk:
+        try:
+            return _import_file(file_path, offset, True, progress, cancel, started)
+        except (psycopg2.Error, ValueError) as e:
+            reason = (str(e).strip().splitlines() or [type(e).__name__])[0]
+            print(f"COPY import of {os.path.basename(file_path)} failed, importing it in batches: {reason}",
+                  file=sys.stderr)
+    return _import_file(file_path, offset, False, progress, cancel, started)
+
+def _import_file(file_path, offset, bulk, progress, cancel, started):
+    stats = {
+        "records": 0, "imported": 0, "updated": 0, "ignored": 0, "rejected": 0,
+        "position": offset, "cancelled": False,
+        "seconds": 0.0, "parse_seconds": 0.0, "db_seconds": 0.0,
+    }
+    rejects = []
+
+    def report():
+        if progress:
+            progress(dict(stats))
+
+    def batches(records):
+        batch = []
+        batch_fields = []
+        end_offset = offset
+        clock = time.perf_counter()
+        for fields, end_offset in records:
+            stats["records"] += 1
+            try:
+                qso = record_to_qso(fields)
+                check_qso_values(qso)
+            except ValueError as e:
+                rejects.append((fields, str(e)))
+                stats["rejected"] += 1
+            else:
+                batch.append(qso)
+                batch_fields.append(fields)
+            if stats["records"] % RESOLVE_BATCH_SIZE == 0:
+                stats["parse_seconds"] += time.perf_counter() - clock
+                yield batch, batch_fields, end_offset
+                clock = time.perf_counter()
+                batch = []
+                batch_fields = []
+                if cancel is not None and cancel.is_set():
+                    stats["cancelled"] = True
+                    return
+        stats["parse_seconds"] += time.perf_counter() - clock
+        yield batch, batch_fields, end_offset
+
+    stat = os.stat(file_path)
+    with open(file_path, "rb") as f, connect_db() as conn:
+        f.seek(offset)
+        records = read_adif(f, with_offsets=True)
+        if bulk:
+            # conn is busy with the COPY while the records stream in, so callsigns
+            # are resolved on a second connection, which commits new ones before
+            # the staged QSOs that reference them are inserted
+            with connect_db() as lookup_conn:
+                resolver = CallsignResolver(lookup_conn)
+
+                def resolved_qsos():
+                    for batch, _, end_offset in batches(records):
+                        resolver.resolve(batch)
+                        yield from batch
+                        stats["position"] = end_offset
+                        report()
+                    resolver.flush()
+                    lookup_conn.commit()
+
+                imported, updated, duplicates = bulk_load_qsos(conn, resolved_qsos())
+            stats["imported"] += imported
+            stats["updated"] += updated
+            stats["ignored"] += duplicates
+        else:
+            resolver = CallsignResolver(conn)
+            index = DedupIndex()
+            for number, (batch, batch_fields, end_offset) in enumerate(batches(records), 1):
+                index.load(conn, {qso["qso_date"] for qso in batch})
+                counts = write_isolated(conn, index, batch, batch_fields, QSO_COLUMNS, rejects, resolver)
+                index.forget()
+                resolver.forget()
+                for outcome, count in counts.items():
+                    stats[outcome] += count
+                stats["position"] = end_offset
+                if number % COMMIT_EVERY_BATCHES == 0:
+                    resolver.flush()
+                    mark_file_imported(conn, file_path, end_offset, stat, complete=False)
+                    conn.commit()
+                report()
+
+        resolver.flush()
+        if stats["records"]:
+            mark_file_imported(conn, file_path, stats["position"], stat, complete=not stats["cancelled"])
+        conn.commit()
+    write_rejects(file_path, rejects, append=offset > 0)
+    stats["rejects_file"] = rejects_path(file_path) if rejects else None
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["db_seconds"] = stats["seconds"] - stats["parse_seconds"]
+    report()
+    return stats
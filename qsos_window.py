@@ -3,7 +3,13 @@ from datetime import datetime
 import os
 import tkinter as tk
 from tkinter import ttk, messagebox
-from config import get_pg_connection
+from background_query import FILTER_DELAY_MS, BackgroundQuery
+from callsign_index import get_callsign_index
+from config import execute_prepared
+from qso_filter import FilterError, parse_filter
+from query_stats import timed
+from row_counts import estimate_count, exact_count, table_count
+from settings_store import get_setting
 from window_prefs import load_window_geometry, save_window_geometry
 
 
@@ -16,15 +22,95 @@ def get_my_callsign():
     3. Empty string
     """
     try:
-        conn = get_pg_connection()
-        with conn.cursor() as cur:
-            cur.execute("SELECT value FROM gen_settings WHERE key ILIKE %s", ('my_hamcall',))
-            row = cur.fetchone()
-            return row[0] if row and row[0] else os.getenv('MY_HAMCALL', '')
+        value = get_setting('my_hamcall', ignore_case=True)
+        return value if value else os.getenv('MY_HAMCALL', '')
     except Exception:
         return os.getenv('MY_HAMCALL', '')
 
 
+# Rows fetched per page while scrolling
+PAGE_SIZE = 200
+# Rows kept in the Treeview; pages scrolled far out of view are dropped
+MAX_ROWS = 1000
+# Next page is fetched when the view is this close (fraction of the loaded rows) to an end
+PREFETCH_FRACTION = 0.2
+
+COLUMNS = ("qso_date", "time_on", "raw_call", "freq", "band", "mode", "raw_operator")
+# Sort key of each sortable column, as SQL expressions matching the indexes of
+# migration 7. id makes every key unique so pages neither skip nor repeat rows;
+# nullable columns are coalesced because row comparisons with NULL fail.
+SORT_KEYS = {
+    "qso_date": ("qso_date", "time_on", "id"),
+    "time_on": ("time_on", "id"),
+    "raw_call": ("COALESCE(raw_call, '')", "id"),
+    "freq": ("freq", "id"),
+    # bands are in frequency order
+    "band": ("freq", "id"),
+    "mode": ("mode", "id"),
+    "raw_operator": ("COALESCE(raw_operator, '')", "id"),
+}
+
+
+# Callsign terms matching more callsigns than this are matched against raw_call instead
+MAX_CALL_IDS = 5000
+
+
+def callsign_ids(pattern):
+    """Return the ids of the callsigns a call: term matches, from the shared callsign index.
+
+    Callsigns are stored without "/", so the pattern is matched without it.
+    Returns None when the index is not loaded yet or is stale after an import
+    (see callsign_index.callsigns_changed()), the pattern is too short or
+    has a * other than at its end, or it matches more than MAX_CALL_IDS
+    callsigns.
+    """
+    index = get_callsign_index()
+    if not index.ready or index.stale:
+        return None
+    pattern = pattern.replace("/", "")
+    if pattern.endswith("*") and "*" not in pattern[:-1] and len(pattern) > 1:
+        return index.prefix_search(pattern[:-1], MAX_CALL_IDS)
+    if "*" in pattern or len(pattern) < 3:
+        return None
+    return index.search(pattern, names=False, limit=MAX_CALL_IDS)
+
+
+def filter_sql(text, my_call=None, call_ids=None):
+    """Return (where, params) of filter *text*: " AND ..." conditions to follow WHERE 1 = 1.
+
+    With *my_call* only QSOs with it as operator or callsign match. See
+    parse_filter() for *call_ids*; raises FilterError for an invalid filter.
+    """
+    conditions, params = parse_filter(text, call_ids)
+    if my_call:
+        conditions.append("(raw_operator ILIKE %s OR raw_call ILIKE %s)")
+        params.extend([my_call, my_call])
+    return "".join(f" AND {c}" for c in conditions), tuple(params)
+
+
+def qso_page_sql(where, params, sort_column="qso_date", sort_descending=True, forward=True, key=None):
+    """Return (query, params) of the page of QSOs after *key*, or the first page without one.
+
+    *forward* pages follow the sort order, the others run against it; either
+    way the query walks the index of the sort key. The key values are
+    selected after the columns.
+    """
+    key_columns = SORT_KEYS[sort_column]
+    query = f"""
+        SELECT {", ".join(COLUMNS)}, {", ".join(key_columns)}
+        FROM qsos
+        WHERE 1 = 1{where}
+    """
+    descending = sort_descending == forward
+    if key is not None:
+        placeholders = ", ".join(["%s"] * len(key))
+        query += f" AND ({', '.join(key_columns)}) {'<' if descending else '>'} ({placeholders})"
+        params += tuple(key)
+    order = "DESC" if descending else "ASC"
+    query += f" ORDER BY {', '.join(f'{c} {order}' for c in key_columns)} LIMIT {PAGE_SIZE}"
+    return query, params
+
+
 def open_qsos_window(master=None):
     QsosWindow(master)
 
@@ -45,6 +131,25 @@ class QsosWindow(tk.Toplevel):
         self.my_call = get_my_callsign()
 
         self.only_mine_var = tk.BooleanVar(value=False)
+        self.query = BackgroundQuery(self)
+        self.page_query = BackgroundQuery(self)
+        self.count_query = BackgroundQuery(self)
+
+        # filter of the listed rows, as SQL conditions and parameters
+        self.where = ""
+        self.params = ()
+        # sort column and direction of the list
+        self.sort_column = "qso_date"
+        self.sort_descending = True
+        # item id -> sort key values of the rows in the Treeview
+        self.keys = {}
+        self.at_start = self.at_end = True
+        self.loading = False
+        self.fetching = None
+        self.total_records = 0
+        # rows matching the filter, and whether that is a count or the planner's estimate
+        self.matching = 0
+        self.matching_exact = True
 
         self.create_widgets()
         self.load_qsos()
@@ -68,9 +173,10 @@ class QsosWindow(tk.Toplevel):
         if not self.my_call:
             self.only_mine_cb.state(['disabled'])
 
-        ttk.Label(filter_frame, text="Filter Callsign:").pack(side="left")
+        # callsign text, or terms like band:20m mode:FT8 date:2024-01..2024-03 (see qso_filter)
+        ttk.Label(filter_frame, text="Filter:").pack(side="left")
         self.filter_var = tk.StringVar()
-        self.filter_var.trace_add("write", lambda *_: self.load_qsos())
+        self.filter_var.trace_add("write", lambda *_: self.load_qsos(FILTER_DELAY_MS))
         self.filter_entry = ttk.Entry(filter_frame, textvariable=self.filter_var)
         self.filter_entry.pack(side="left", fill="x", expand=True)
 
@@ -81,19 +187,20 @@ class QsosWindow(tk.Toplevel):
         tree_frame.rowconfigure(0, weight=1)
         tree_frame.columnconfigure(0, weight=1)
 
-        columns = ("qso_date", "time_on", "raw_call", "freq", "mode", "raw_operator")
-        self.tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
-        for col in columns:
-            self.tree.heading(col, text=col.replace("_", " ").title(),
-                              command=lambda c=col: self.treeview_sort_column(c, False))
+        self.tree = ttk.Treeview(tree_frame, columns=COLUMNS, show="headings")
+        for col in COLUMNS:
+            self.tree.heading(col, command=lambda c=col: self.sort_by(c))
             self.tree.column(col, width=100)
+        self.update_headings()
 
         self.tree.grid(row=0, column=0, sticky="nsew")
 
         scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.tree.yview)
         scrollbar.grid(row=0, column=1, sticky="ns")
-        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.configure(yscrollcommand=lambda first, last: self.on_scroll(scrollbar, first, last))
 
+        self.tree.bind("<Control-Home>", lambda e: self.load_qsos(from_end=False))
+        self.tree.bind("<Control-End>", lambda e: self.load_qsos(from_end=True))
         self.tree.bind("<Double-1>", self.on_row_double_click if hasattr(self, 'on_row_double_click') else lambda e: None)
 
         # --- Buttons (Close etc.) ---
@@ -101,6 +208,8 @@ class QsosWindow(tk.Toplevel):
         btn_frame.grid(row=2, column=0, sticky="ew", padx=5, pady=5)
         self.close_btn = ttk.Button(btn_frame, text="Close", command=self.on_close)
         self.close_btn.pack(side="right")
+        self.count_btn = ttk.Button(btn_frame, text="Count Matches", command=self.count_matches)
+        self.count_btn.pack(side="left")
 
         # --- Status bar ---
         self.status_frame = ttk.Frame(self)
@@ -116,67 +225,176 @@ class QsosWindow(tk.Toplevel):
         self.update_clock()
 
     # ---------- Data ----------
-    def load_qsos(self):
-        """Load QSOs into treeview honoring filter text and only‑mine checkbox."""
-        filter_text = self.filter_var.get().strip()
+    def load_qsos(self, delay=0, from_end=False):
+        """Load the first page of QSOs honoring filter text, only‑mine checkbox and sort order.
 
+        The query runs on a worker thread after *delay* ms and replaces any
+        query still pending or running. Further pages are fetched as the list
+        is scrolled; *from_end* starts the list at its last page instead.
+        """
         try:
-            conn = get_pg_connection()
-            cur = conn.cursor()
-
-            # Get total number of rows in the table (for the status bar)
-            cur.execute("SELECT COUNT(*) FROM qsos")
-            total_records = cur.fetchone()[0]
+            self.where, self.params = filter_sql(
+                self.filter_var.get(), self.my_call if self.only_mine_var.get() else None, callsign_ids)
+        except FilterError as e:
+            self.query.cancel()
+            self.status_var.set(str(e))
+            return
 
-            # Build main query
-            base_query = '''
-                SELECT qso_date, time_on, raw_call, freq, mode, raw_operator
-                FROM qsos
-                WHERE 1 = 1
-            '''
-            params = []
+        query, query_params = self.page_sql(forward=not from_end)
+        where, params = self.where, self.params
+
+        def fetch(conn):
+            with timed("QSOs: query"), conn.cursor() as cur:
+                # Totals for the status bar: the maintained table count and,
+                # with a filter, the planner's estimate of the matching rows
+                total_records = table_count(cur, "qsos")
+                matching = estimate_count(cur, f"SELECT 1 FROM qsos WHERE 1 = 1{where}", params) \
+                    if where else total_records
+
+                execute_prepared(cur, query, query_params)
+                return cur.fetchall(), total_records, matching
+
+        self.page_query.cancel()
+        self.count_query.cancel()
+        self.fetching = None
+        self.loading = True
+        self.status_var.set("Loading QSOs...")
+        self.query.run(fetch, lambda result: self.show_qsos(result, from_end), self.show_load_error, delay)
+
+    def page_sql(self, forward=True, key=None):
+        """Return (query, params) of the page after *key* with the current filter and sort order."""
+        return qso_page_sql(self.where, self.params, self.sort_column, self.sort_descending, forward, key)
+
+    def sort_by(self, column):
+        """Sort the list by *column* on the server; clicking the sorted column reverses the order."""
+        if column == self.sort_column:
+            self.sort_descending = not self.sort_descending
+        else:
+            self.sort_column = column
+            self.sort_descending = column == "qso_date"
+        self.update_headings()
+        self.load_qsos()
 
-            if self.only_mine_var.get() and self.my_call:
-                base_query += " AND (raw_operator ILIKE %s OR raw_call ILIKE %s)"
-                params.extend([self.my_call, self.my_call])
+    def update_headings(self):
+        """Mark the sort column's heading with the sort direction."""
+        for col in COLUMNS:
+            text = col.replace("_", " ").title()
+            if col == self.sort_column:
+                text += " \u25bc" if self.sort_descending else " \u25b2"
+            self.tree.heading(col, text=text)
+
+    def show_qsos(self, result, from_end=False):
+        rows, self.total_records, self.matching = result
+        self.matching_exact = not self.where
+        self.loading = False
+
+        # Populate treeview
+        with timed("QSOs: fill list"):
+            self.tree.delete(*self.tree.get_children())
+            self.keys.clear()
+            if from_end:
+                rows.reverse()
+            for row in rows:
+                self.insert_row("end", row)
+        self.at_start = not from_end or len(rows) < PAGE_SIZE
+        self.at_end = from_end or len(rows) < PAGE_SIZE
+        if from_end:
+            self.tree.yview_moveto(1.0)
+        self.update_status()
+
+    def insert_row(self, index, row):
+        # the sort key follows the columns and ends with id
+        iid = str(row[-1])
+        self.keys[iid] = row[len(COLUMNS):]
+        self.tree.insert("", index, iid=iid, values=row[:len(COLUMNS)])
+
+    def on_scroll(self, scrollbar, first, last):
+        scrollbar.set(first, last)
+        if self.loading or self.fetching:
+            return
+        if float(last) > 1 - PREFETCH_FRACTION and not self.at_end:
+            self.fetch_page(forward=True)
+        elif float(first) < PREFETCH_FRACTION and not self.at_start:
+            self.fetch_page(forward=False)
+
+    def fetch_page(self, forward):
+        """Fetch the page before the first or after the last row on a worker thread."""
+        items = self.tree.get_children()
+        if not items:
+            return
+        query, params = self.page_sql(forward, self.keys[items[-1] if forward else items[0]])
 
-            if filter_text:
-                base_query += " AND raw_call ILIKE %s"
-                params.append(f"%{filter_text}%")
+        def fetch(conn):
+            with timed("QSOs: page query"), conn.cursor() as cur:
+                execute_prepared(cur, query, params)
+                return cur.fetchall()
 
-            base_query += " ORDER BY qso_date DESC, time_on DESC LIMIT 500"
+        self.fetching = "forward" if forward else "backward"
+        self.page_query.run(fetch, lambda rows: self.add_page(rows, forward), self.show_load_error)
 
-            cur.execute(base_query, tuple(params))
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
+    def add_page(self, rows, forward):
+        """Add a fetched page at its end of the list and drop rows beyond MAX_ROWS at the other."""
+        self.fetching = None
+        items = self.tree.get_children()
+        first_visible = self.tree.index(self.tree.identify_row(1) or items[0]) if items else 0
 
-            # Populate treeview
-            self.tree.delete(*self.tree.get_children())
+        with timed("QSOs: fill list"):
             for row in rows:
-                self.tree.insert("", "end", values=row)
-
-            # Update record count
-            self.status_var.set(f"QSOs: {len(rows)}/{total_records}")
-
-        except Exception as e:
-            messagebox.showerror("Error", f"Error loading QSOs:\n{e}")
+                # backward pages come in reverse order and go in at the top
+                self.insert_row("end" if forward else 0, row)
+            if forward:
+                self.at_end = len(rows) < PAGE_SIZE
+            else:
+                self.at_start = len(rows) < PAGE_SIZE
+                first_visible += len(rows)
+
+            items = self.tree.get_children()
+            excess = len(items) - MAX_ROWS
+            if excess > 0:
+                dropped = items[:excess] if forward else items[-excess:]
+                self.tree.delete(*dropped)
+                for iid in dropped:
+                    del self.keys[iid]
+                if forward:
+                    self.at_start = False
+                    first_visible -= excess
+                else:
+                    self.at_end = False
+
+        # keep the rows that were visible in view
+        self.tree.yview_moveto(max(first_visible, 0) / max(len(self.tree.get_children()), 1))
+        self.update_status()
+
+    def count_matches(self):
+        """Count the QSOs matching the filter exactly, replacing the estimate."""
+        where, params = self.where, self.params
+
+        def fetch(conn):
+            with timed("QSOs: count"), conn.cursor() as cur:
+                return exact_count(cur, f"SELECT 1 FROM qsos WHERE 1 = 1{where}", params)
+
+        self.count_query.run(fetch, self.show_count, self.show_load_error)
+
+    def show_count(self, count):
+        self.matching = count
+        self.matching_exact = True
+        self.update_status()
+
+    def update_status(self):
+        matching = f"{self.matching}" if self.matching_exact else f"~{self.matching}"
+        self.status_var.set(f"QSOs: {len(self.keys)} loaded/{matching} matching/{self.total_records}")
+
+    def show_load_error(self, error):
+        self.loading = False
+        self.fetching = None
+        self.status_var.set("")
+        messagebox.showerror("Error", f"Error loading QSOs:\n{error}", parent=self)
 
     # ---------- Helpers ----------
     def update_clock(self):
         self.clock_var.set(datetime.now().strftime("%H:%M:%S"))
         self.after(1000, self.update_clock)
 
-    def treeview_sort_column(self, col, reverse):
-        l = [(self.tree.set(k, col), k) for k in self.tree.get_children('')]
-        try:
-            l.sort(key=lambda t: float(t[0]), reverse=reverse)
-        except ValueError:
-            l.sort(reverse=reverse)
-        for index, (val, k) in enumerate(l):
-            self.tree.move(k, '', index)
-        self.tree.heading(col, command=lambda: self.treeview_sort_column(col, not reverse))
-
     def on_row_double_click(self, event):
         item = self.tree.identify_row(event.y)
         if not item:
@@ -191,5 +409,8 @@ class QsosWindow(tk.Toplevel):
                 messagebox.showerror("Error", f"Error opening Callsign detail:\n{e}")
 
     def on_close(self):
+        self.query.close()
+        self.page_query.close()
+        self.count_query.close()
         save_window_geometry("qsos", self.geometry())
         self.destroy()
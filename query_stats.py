@@ -0,0 +1,171 @@
+"""Timing statistics for SQL statements and window loads.
+
+db_pool.TimedCursor is the default cursor of pooled connections, so every
+statement the application runs is measured: latency, rows and the line of
+application code that ran it. Statements are grouped by their text, literal
+values replaced by ?, and each group keeps its count, total, maximum and the
+last SAMPLES_KEPT latencies for percentiles. Statements slower than the
+slow-query threshold are reported on stderr, so they never mix with a
+command's output, and kept in a short log.
+
+Windows wrap their load steps (query, filling the Treeview) in timed(name) so
+the Diagnostics window can tell the database time from the Tk time.
+"""
+
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Statements at least this slow are reported on stderr and kept in the slow-query log
+SLOW_QUERY_SECONDS = 0.2
+# Latencies kept per statement or timing for the percentiles
+SAMPLES_KEPT = 500
+# Entries of the slow-query log
+SLOW_LOG_SIZE = 100
+# Distinct statements tracked; further ones are counted under "(other)"
+MAX_TRACKED = 500
+# Characters of statement text shown
+TEXT_LENGTH = 300
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?")
+_VALUE_LISTS = re.compile(r"(\((?:\?, ?)*\?\))(?:, ?\((?:\?, ?)*\?\))+")
+# Frames of these files are skipped when looking for the statement's call site
+_INTERNAL_FILES = ("config.py", "db_pool.py", "query_stats.py", "settings_store.py")
+
+_lock = threading.Lock()
+_queries = {}
+_timings = {}
+_slow = deque(maxlen=SLOW_LOG_SIZE)
+_slow_seconds = SLOW_QUERY_SECONDS
+
+
+class Samples:
+    """Count, total and maximum of a measurement plus its most recent values."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.site = ""
+        self.recent = deque(maxlen=SAMPLES_KEPT)
+
+    def add(self, seconds, rows=0, site=""):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.rows += rows
+        self.recent.append(seconds)
+        if site:
+            self.site = site
+
+    def summary(self):
+        values = sorted(self.recent)
+
+        def percentile(p):
+            return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else 0.0
+
+        return {
+            "count": self.count, "total": self.total, "max": self.max,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": percentile(50), "p95": percentile(95), "p99": percentile(99),
+            "rows": self.rows, "site": self.site,
+        }
+
+
+def statement_text(query):
+    """Group key of *query*: whitespace collapsed, literals (of unparameterized SQL) replaced by ?."""
+    if isinstance(query, bytes):
+        query = query[:4 * TEXT_LENGTH].decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        query = str(query)
+    text = " ".join(query[:4 * TEXT_LENGTH].split())
+    text = _NUMBER_LITERAL.sub("?", _STRING_LITERAL.sub("?", text))
+    return _VALUE_LISTS.sub(r"\1, ...", text)[:TEXT_LENGTH]
+
+
+def call_site():
+    """Return "file:line function" of the application code that ran the statement."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if os.path.basename(filename) not in _INTERNAL_FILES and "psycopg2" not in filename:
+            return f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return ""
+
+
+def record_query(text, seconds, rows, site):
+    with _lock:
+        samples = _queries.get(text)
+        if samples is None:
+            if len(_queries) >= MAX_TRACKED:
+                text = "(other)"
+                samples = _queries.get(text)
+            if samples is None:
+                samples = _queries[text] = Samples()
+        samples.add(seconds, max(rows, 0), site)
+        slow = seconds >= _slow_seconds
+        if slow:
+            _slow.append({"at": time.time(), "seconds": seconds, "rows": rows, "site": site, "query": text})
+    if slow:
+        print(f"Slow query ({seconds * 1000:.0f} ms, {rows} rows) at {site}: {text}", file=sys.stderr)
+
+
+def record_timing(name, seconds):
+    with _lock:
+        samples = _timings.get(name)
+        if samples is None:
+            samples = _timings[name] = Samples()
+        samples.add(seconds)
+
+
+@contextmanager
+def timed(name):
+    """Record how long the with block takes under *name*, e.g. "QSOs: fill list"."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - started)
+
+
+def set_slow_query_seconds(seconds):
+    global _slow_seconds
+    _slow_seconds = seconds
+
+
+def slow_query_seconds():
+    return _slow_seconds
+
+
+def query_summary():
+    """Per-statement statistics, slowest p95 first."""
+    with _lock:
+        rows = [dict(samples.summary(), query=text) for text, samples in _queries.items()]
+    return sorted(rows, key=lambda r: r["p95"], reverse=True)
+
+
+def timing_summary():
+    """Per-name window timings, slowest p95 first."""
+    with _lock:
+        rows = [dict(samples.summary(), name=name) for name, samples in _timings.items()]
+    return sorted(rows, key=lambda r: r["p95"], reverse=True)
+
+
+def slow_queries():
+    """The slow-query log, newest first."""
+    with _lock:
+        return list(reversed(_slow))
+
+
+def reset():
+    with _lock:
+        _queries.clear()
+        _timings.clear()
+        _slow.clear()
@@ -0,0 +1,61 @@
+"""Row counts for status bars without scanning the tables.
+
+COUNT(*) reads the whole table in PostgreSQL. The row_counts table
+(migration 6) instead holds the number of rows of each table in
+COUNTED_TABLES, kept current by statement-level triggers, so a total costs one
+index lookup. The number of rows matching a filter is estimated from the
+planner's row estimate (EXPLAIN); exact_count() is for when the user asks.
+"""
+
+import json
+from config import execute_prepared
+
+# Tables whose rows the row_counts triggers count
+COUNTED_TABLES = ("qsos", "callsigns")
+
+# Set once row_counts is known to exist; until then every table_count() checks
+_row_counts_exist = False
+
+
+def row_counts_exist(cur):
+    """Return whether the row_counts table exists, i.e. migration 6 has been applied."""
+    global _row_counts_exist
+    if not _row_counts_exist:
+        execute_prepared(cur, "SELECT to_regclass('row_counts') IS NOT NULL")
+        _row_counts_exist = cur.fetchone()[0]
+    return _row_counts_exist
+
+
+def table_count(cur, table):
+    """Return the number of rows of *table*.
+
+    Falls back to the planner's estimate (pg_class.reltuples) for a table
+    without a counter row, e.g. before migration 6.
+    """
+    if table not in COUNTED_TABLES:
+        raise ValueError(f"No row count kept for table {table!r}")
+    # a query on a missing row_counts would abort the caller's transaction
+    if row_counts_exist(cur):
+        execute_prepared(cur, "SELECT row_count FROM row_counts WHERE table_name = %s", (table,))
+        row = cur.fetchone()
+        if row is not None:
+            return row[0]
+    execute_prepared(cur, "SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    # reltuples is -1 for a table that has never been analyzed
+    return max(int(row[0]), 0) if row else 0
+
+
+def estimate_count(cur, query, params=()):
+    """Return the planner's estimate of the number of rows *query* returns."""
+    cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+    plan = cur.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def exact_count(cur, query, params=()):
+    """Return the number of rows *query* returns, counting them."""
+    execute_prepared(cur, f"SELECT COUNT(*) FROM ({query}) AS counted", params)
+    return cur.fetchone()[0]
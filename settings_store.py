@@ -0,0 +1,146 @@
+"""In-process cache of the gen_settings table.
+
+gen_settings is read once, on first use, and served from memory afterwards.
+Changes are applied to the cache at once and written behind: a change waits
+WRITE_DELAY_SECONDS for further changes, then everything pending goes to the
+database in one upsert. flush_settings() writes pending changes right away and
+runs at interpreter exit; MainWindow calls it on close.
+"""
+
+import atexit
+import threading
+from config import get_pg_connection
+
+# Seconds a changed setting waits for further changes before it is written
+WRITE_DELAY_SECONDS = 2.0
+
+
+class SettingsStore:
+    def __init__(self, delay=WRITE_DELAY_SECONDS):
+        self.delay = delay
+        self._lock = threading.RLock()
+        # held while writing, so a flush at exit waits for one already running
+        self._write_lock = threading.Lock()
+        self._values = None
+        self._pending = {}
+        self._timer = None
+
+    def _load(self):
+        if self._values is None:
+            with get_pg_connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT key, value FROM gen_settings")
+                    self._values = dict(cur.fetchall())
+        return self._values
+
+    def get(self, key, default=None, ignore_case=False):
+        """Return the value of *key*, or *default* when it is not set."""
+        with self._lock:
+            values = self._load()
+            if key in values:
+                return values[key]
+            if ignore_case:
+                wanted = key.lower()
+                for name, value in values.items():
+                    if name.lower() == wanted:
+                        return value
+            return default
+
+    def items(self):
+        """Return all settings as a list of (key, value) sorted by key."""
+        with self._lock:
+            return sorted(self._load().items())
+
+    def set(self, key, value):
+        """Change *key* in memory and schedule the write."""
+        with self._lock:
+            values = self._load()
+            if key in values and values[key] == value and key not in self._pending:
+                return
+            values[key] = value
+            self._pending[key] = value
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def update(self, changes, deleted=()):
+        """Set *changes* ({key: value}) and delete the keys in *deleted*, writing immediately.
+
+        Changes still waiting to be written go out in the same transaction;
+        settings not named are left as they are.
+        """
+        from psycopg2.extras import execute_values
+        with self._write_lock, self._lock:
+            values = self._load()
+            pending = {**self._pending, **changes}
+            for key in deleted:
+                pending.pop(key, None)
+            with get_pg_connection() as conn:
+                with conn.cursor() as cur:
+                    if pending:
+                        execute_values(cur, """
+                            INSERT INTO gen_settings (key, value) VALUES %s
+                            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+                        """, list(pending.items()))
+                    if deleted:
+                        cur.execute("DELETE FROM gen_settings WHERE key = ANY(%s)", (list(deleted),))
+                conn.commit()
+            self._cancel_timer()
+            self._pending.clear()
+            values.update(changes)
+            for key in deleted:
+                values.pop(key, None)
+
+    def flush(self):
+        """Write the pending changes in one upsert; they are kept for the next flush on failure."""
+        with self._write_lock:
+            with self._lock:
+                self._cancel_timer()
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            try:
+                from psycopg2.extras import execute_values
+                with get_pg_connection() as conn:
+                    with conn.cursor() as cur:
+                        execute_values(cur, """
+                            INSERT INTO gen_settings (key, value) VALUES %s
+                            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value
+                        """, list(pending.items()))
+                    conn.commit()
+            except Exception as e:
+                with self._lock:
+                    for key, value in pending.items():
+                        self._pending.setdefault(key, value)
+                print(f"Error saving settings {', '.join(sorted(pending))}: {e}")
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+_store = SettingsStore()
+atexit.register(_store.flush)
+
+
+def get_setting(key, default=None, ignore_case=False):
+    return _store.get(key, default, ignore_case)
+
+
+def set_setting(key, value):
+    _store.set(key, value)
+
+
+def all_settings():
+    return _store.items()
+
+
+def update_settings(changes, deleted=()):
+    _store.update(changes, deleted)
+
+
+def flush_settings():
+    _store.flush()
@@ -1,17 +1,6 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import psycopg2
-from config import DB_SETTINGS
-
-
-def get_pg_connection():
-    return psycopg2.connect(
-        dbname=DB_SETTINGS["database"],
-        user=DB_SETTINGS["user"],
-        password=DB_SETTINGS["password"],
-        host=DB_SETTINGS["host"],
-        port=DB_SETTINGS["port"]
-    )
+from settings_store import all_settings, update_settings
 
 
 class SettingsWindow(tk.Toplevel):
@@ -28,6 +17,9 @@ class SettingsWindow(tk.Toplevel):
 
         self.tree.bind("<Double-1>", self.on_double_click)
 
+        # Settings as last loaded or saved; only what the user changed since is written
+        self.loaded = {}
+
         # Buttons
         btn_frame = ttk.Frame(self)
         btn_frame.pack(pady=5)
@@ -41,13 +33,11 @@ class SettingsWindow(tk.Toplevel):
 
     def load_settings(self):
         try:
-            with get_pg_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("SELECT key, value FROM gen_settings ORDER BY key")
-                    rows = cur.fetchall()
-                    self.tree.delete(*self.tree.get_children())
-                    for row in rows:
-                        self.tree.insert("", "end", values=row)
+            rows = all_settings()
+            self.loaded = dict(rows)
+            self.tree.delete(*self.tree.get_children())
+            for row in rows:
+                self.tree.insert("", "end", values=row)
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to load settings:\n{e}")
 
@@ -86,17 +76,15 @@ class SettingsWindow(tk.Toplevel):
 
     def save_changes(self):
         try:
-            with get_pg_connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute("DELETE FROM gen_settings")  # clear all first
-                    for item in self.tree.get_children():
-                        key, value = self.tree.item(item, "values")
-                        if key:  # skip blank keys
-                            cur.execute(
-                                "INSERT INTO gen_settings (key, value) VALUES (%s, %s)",
-                                (key, value)
-                            )
-                conn.commit()
+            items = {}
+            for item in self.tree.get_children():
+                key, value = map(str, self.tree.item(item, "values"))
+                if key:  # skip blank keys
+                    items[key] = value
+            changes = {key: value for key, value in items.items() if self.loaded.get(key) != value}
+            deleted = [key for key in self.loaded if key not in items]
+            update_settings(changes, deleted)
+            self.loaded = items
             messagebox.showinfo("Saved", "Settings saved successfully.")
         except Exception as e:
             messagebox.showerror("Database Error", f"Failed to save settings:\n{e}")
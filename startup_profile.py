@@ -0,0 +1,77 @@
+"""Startup timing for `python main.py --profile-startup`.
+
+StartupProfile wraps builtins.__import__ while the application starts and
+records how long each top-level import took, including the modules it pulled
+in, and when the main window reached each step of its startup (window
+created, first frame drawn, settings loaded, background shown). report()
+prints both, slowest imports first. The imports made by an entry module,
+such as main_window, count as top-level imports of their own.
+"""
+
+import builtins
+import sys
+import threading
+import time
+
+# Imports faster than this are summed up in one line of the report
+REPORT_MIN_SECONDS = 0.001
+
+
+class StartupProfile:
+    def __init__(self, entry_modules=()):
+        self.started = time.perf_counter()
+        # modules whose imports are timed one by one rather than as a whole
+        self.entry_modules = set(entry_modules)
+        self.imports = {}
+        self.marks = []
+        self._depth = threading.local()
+        self._original_import = None
+
+    def start(self):
+        """Begin timing imports; call before the application modules are imported."""
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def stop(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        depth = getattr(self._depth, "value", 0)
+        # only the outermost import of a module not loaded yet is timed; the
+        # modules it imports in turn are part of its time
+        if depth or level or name in sys.modules or name in self.entry_modules:
+            return original(name, globals, locals, fromlist, level)
+        self._depth.value = 1
+        started = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            self._depth.value = 0
+            self.imports[name] = self.imports.get(name, 0.0) + time.perf_counter() - started
+
+    def mark(self, name):
+        """Record that startup reached *name*; only the first mark of a name counts."""
+        if all(n != name for n, _ in self.marks):
+            self.marks.append((name, time.perf_counter() - self.started))
+
+    def report(self, file=None):
+        file = file or sys.stdout
+        print("Startup profile", file=file)
+        print("  Imports (ms, including the modules they import):", file=file)
+        small_count, small_total = 0, 0.0
+        for name, seconds in sorted(self.imports.items(), key=lambda item: item[1], reverse=True):
+            if seconds < REPORT_MIN_SECONDS:
+                small_count += 1
+                small_total += seconds
+                continue
+            print(f"    {seconds * 1000:9.1f}  {name}", file=file)
+        if small_count:
+            print(f"    {small_total * 1000:9.1f}  ({small_count} imports under "
+                  f"{REPORT_MIN_SECONDS * 1000:g} ms)", file=file)
+        print(f"    {sum(self.imports.values()) * 1000:9.1f}  total", file=file)
+        print("  Milestones (ms since start):", file=file)
+        for name, seconds in self.marks:
+            print(f"    {seconds * 1000:9.1f}  {name}", file=file)
@@ -0,0 +1,130 @@
+"""Local stand-in for the QRZ XML API, for testing QrzClient without qrz.com.
+
+    python tests/qrz_standin.py [--port 8099]
+
+serves http://127.0.0.1:PORT/ until interrupted. It answers like
+xmldata.qrz.com/xml/current/: a login (username, password, agent) returns a
+session key, a request with a valid key s returns the Callsign record of
+any callsign in CALLSIGNS, or "Not found", inside the QRZ namespace. Keys
+are invalidated with expire_keys(). Connections are kept alive, and the
+server counts logins, lookups and the TCP connections it accepted.
+"""
+
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+USERNAME = "N0CALL"
+PASSWORD = "secret"
+
+# Callsign -> fields of its record
+CALLSIGNS = {
+    "OH3AA": {"call": "OH3AA", "name": "Test Operator", "dxcc": "224", "addr2": "Tampere",
+              "country": "Finland", "lat": "61.5", "lon": "23.8", "grid": "KP11"},
+    "W1AW": {"call": "W1AW", "name": "ARRL HQ", "dxcc": "291", "state": "CT", "country": "United States",
+             "grid": "FN31"},
+}
+
+NAMESPACE = "http://xmldata.qrz.com"
+
+
+def response(callsign=None, key=None, error=None):
+    """XML document of a QRZ response."""
+    parts = [f'<?xml version="1.0" encoding="utf-8" ?>\n<QRZDatabase version="1.34" xmlns="{NAMESPACE}">']
+    if callsign is not None:
+        fields = "".join(f"<{tag}>{escape(value)}</{tag}>" for tag, value in callsign.items())
+        parts.append(f"<Callsign>{fields}</Callsign>")
+    session = f"<Key>{key}</Key>" if key else ""
+    if error:
+        session += f"<Error>{escape(error)}</Error>"
+    parts.append(f"<Session>{session}<GMTime>Sun Jan  1 00:00:00 2024</GMTime></Session></QRZDatabase>")
+    return "".join(parts).encode("utf-8")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        params = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+        with server.lock:
+            if "username" in params:
+                if params["username"] == USERNAME and params.get("password") == PASSWORD:
+                    server.logins += 1
+                    key = f"standin{server.logins:04d}"
+                    server.keys.add(key)
+                    body = response(key=key)
+                else:
+                    body = response(error="Username/password incorrect")
+            elif params.get("s") not in server.keys:
+                body = response(error="Invalid session key")
+            else:
+                server.lookups += 1
+                callsign = params.get("callsign", "").upper()
+                record = CALLSIGNS.get(callsign)
+                if record is None:
+                    body = response(key=params["s"], error=f"Not found: {callsign}")
+                else:
+                    body = response(callsign=record, key=params["s"])
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class QrzStandIn(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self.lock = threading.Lock()
+        self.keys = set()
+        self.logins = 0
+        self.lookups = 0
+        self.connections = 0
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}/xml/current/"
+
+    def expire_keys(self):
+        """Make every session key handed out so far invalid, as QRZ does when a session times out."""
+        with self.lock:
+            self.keys.clear()
+
+    def start(self):
+        """Serve on a daemon thread; returns self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a stand-in of the QRZ XML API.")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args(argv)
+    server = QrzStandIn(args.port)
+    print(f"QRZ stand-in at {server.url} (username {USERNAME}, password {PASSWORD})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""QrzClient against the local QRZ stand-in (tests/qrz_standin.py).
+
+    python -m pytest tests          or          python -m unittest discover tests
+
+gen_settings is replaced by a dict, so no database is needed.
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import qrz_api
+from qrz_standin import PASSWORD, USERNAME, QrzStandIn
+
+try:
+    import requests  # noqa: F401
+except ImportError:
+    requests = None
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class QrzClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = QrzStandIn().start()
+        self.addCleanup(self.server.stop)
+        self.settings = {"qrz_username": USERNAME, "qrz_password": PASSWORD}
+        for name, replacement in (("get_setting", self.get_setting), ("set_setting", self.settings.__setitem__)):
+            patcher = mock.patch.object(qrz_api, name, replacement)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_setting(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def client(self):
+        client = qrz_api.QrzClient(url=self.server.url, timeout=5)
+        self.addCleanup(lambda: client._http is not None and client._http.close())
+        return client
+
+    def test_lookup_reuses_the_session_key(self):
+        client = self.client()
+        self.assertEqual(client.lookup("OH3AA")["wholename"], "Test Operator")
+        self.assertEqual(client.lookup("W1AW")["dxcc"], 291)
+        self.assertEqual(self.server.logins, 1)
+        self.assertEqual(self.settings["qrz_session_key"], client.key)
+        self.assertEqual(self.settings["qrz_session_user"], USERNAME)
+
+    def test_stored_key_survives_a_restart(self):
+        self.client().lookup("OH3AA")
+        self.client().lookup("OH3AA")
+        self.assertEqual(self.server.logins, 1)
+
+    def test_stored_key_of_another_user_is_not_used(self):
+        self.client().lookup("OH3AA")
+        self.settings["qrz_session_user"] = "OTHER"
+        self.client().lookup("OH3AA")
+        self.assertEqual(self.server.logins, 2)
+
+    def test_expired_key_logs_in_again_once(self):
+        client = self.client()
+        client.lookup("OH3AA")
+        old_key = client.key
+        self.server.expire_keys()
+        self.assertEqual(client.lookup("OH3AA")["country"], "Finland")
+        self.assertEqual(self.server.logins, 2)
+        self.assertNotEqual(client.key, old_key)
+        self.assertEqual(self.settings["qrz_session_key"], client.key)
+
+    def test_key_past_its_lifetime_logs_in_again(self):
+        client = self.client()
+        client.lookup("OH3AA")
+        client.expires = time.time() - 1
+        self.settings["qrz_session_expires"] = "0"
+        client.lookup("OH3AA")
+        self.assertEqual(self.server.logins, 2)
+
+    def test_not_found(self):
+        client = self.client()
+        with self.assertRaisesRegex(qrz_api.QrzError, "Not found: NOSUCH"):
+            client.lookup("NOSUCH")
+        # the key is still valid: no second login
+        client.lookup("OH3AA")
+        self.assertEqual(self.server.logins, 1)
+
+    def test_bad_password(self):
+        self.settings["qrz_password"] = "wrong"
+        with self.assertRaisesRegex(qrz_api.QrzError, "Username/password incorrect"):
+            self.client().lookup("OH3AA")
+
+    def test_missing_credentials(self):
+        del self.settings["qrz_password"]
+        with self.assertRaises(ValueError):
+            self.client().lookup("OH3AA")
+
+    def test_connection_is_reused(self):
+        client = self.client()
+        for _ in range(5):
+            client.lookup("OH3AA")
+        self.server.expire_keys()
+        client.lookup("W1AW")
+        self.assertEqual(self.server.lookups, 6)
+        self.assertEqual(self.server.connections, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
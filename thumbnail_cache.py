@@ -0,0 +1,101 @@
+"""Scaled copies of images, cached on disk and in memory.
+
+thumbnail_path() returns a PNG of an image scaled to fit a given size,
+stored in CACHE_DIR under a key of the image's path, mtime, file size and the
+target size, so a changed image or another size gets a file of its own. Tk
+reads those PNGs itself; PIL is only imported when a thumbnail has to be
+made. The directory is kept under MAX_CACHE_BYTES by deleting the least
+recently used thumbnails, a hit refreshing the file's mtime.
+
+photo_image() also keeps the last MAX_PHOTOS PhotoImages it made, so showing
+the same image again, e.g. reopening a callsign's detail window, decodes
+nothing. It must be called on the Tk thread; thumbnail_path() may be called
+from any thread.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import tkinter as tk
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "hamdata", "thumbnails")
+# Thumbnails are deleted, least recently used first, beyond this many bytes
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+# PhotoImages kept by photo_image()
+MAX_PHOTOS = 32
+
+_evict_lock = threading.Lock()
+# (path, mtime_ns, size, width, height) -> PhotoImage, least recently used first
+_photos = OrderedDict()
+
+
+def _key(image_path, width, height):
+    stat = os.stat(image_path)
+    return os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size, width, height
+
+
+def thumbnail_path(image_path, width, height):
+    """Return a PNG of *image_path* scaled to fit width x height, creating it on a cache miss."""
+    key = "|".join(map(str, _key(image_path, width, height)))
+    cache_path = os.path.join(CACHE_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".png")
+    try:
+        os.utime(cache_path)
+        return cache_path
+    except FileNotFoundError:
+        pass
+
+    from PIL import Image
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with Image.open(image_path) as image:
+        image.thumbnail((width, height))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        # written under another name first so a half-written file is never read
+        tmp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        image.save(tmp_path, "PNG")
+    os.replace(tmp_path, cache_path)
+    evict(keep=cache_path)
+    return cache_path
+
+
+def evict(max_bytes=MAX_CACHE_BYTES, keep=None):
+    """Delete the least recently used thumbnails until the cache holds at most *max_bytes*."""
+    with _evict_lock:
+        entries = []
+        total = 0
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if not entry.name.endswith(".png"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+def photo_image(image_path, width, height):
+    """Return a PhotoImage of *image_path* scaled to fit width x height."""
+    key = _key(image_path, width, height)
+    photo = _photos.get(key)
+    if photo is not None:
+        _photos.move_to_end(key)
+        return photo
+    photo = tk.PhotoImage(file=thumbnail_path(image_path, width, height))
+    _photos[key] = photo
+    while len(_photos) > MAX_PHOTOS:
+        _photos.popitem(last=False)
+    return photo
@@ -0,0 +1,138 @@
+"""Treeview over a Python list of rows of any length.
+
+VirtualTree keeps the rows in a list and creates Treeview items only for the
+rows in view, re-filling the same items as the list is scrolled; the
+scrollbar, mouse wheel and arrow keys move through the list, not the
+Treeview. Showing, appending or scrolling 300k rows thus costs as many Tk
+calls as showing a screenful.
+"""
+
+import tkinter.font as tkfont
+from tkinter import ttk
+
+# Rows scrolled per mouse wheel notch
+WHEEL_ROWS = 3
+
+
+class VirtualTree(ttk.Frame):
+    def __init__(self, master, columns):
+        super().__init__(master)
+        self.rows = []
+        self.top = 0
+        self.visible = 1
+        # index in rows of the selected row, kept while it is scrolled out of view
+        self.selected = None
+
+        self.rowconfigure(0, weight=1)
+        self.columnconfigure(0, weight=1)
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", selectmode="browse")
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+
+        rowheight = ttk.Style(self).lookup("Treeview", "rowheight")
+        self.row_height = int(rowheight) if rowheight else tkfont.nametofont("TkDefaultFont").metrics("linespace") + 4
+
+        self.tree.bind("<Configure>", self.on_configure)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_wheel)
+        self.tree.bind("<Button-4>", self.on_wheel)
+        self.tree.bind("<Button-5>", self.on_wheel)
+        self.tree.bind("<Up>", lambda e: self.move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self.move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self.move_selection(-self.visible))
+        self.tree.bind("<Next>", lambda e: self.move_selection(self.visible))
+        self.tree.bind("<Home>", lambda e: self.move_selection(-len(self.rows)))
+        self.tree.bind("<End>", lambda e: self.move_selection(len(self.rows)))
+
+    def set_rows(self, rows):
+        """Show *rows* (a list of value tuples) from the top."""
+        self.rows = rows
+        self.top = 0
+        self.selected = None
+        self.render()
+
+    def extend(self, rows):
+        """Append *rows*; the Treeview is only touched if they come into view."""
+        start = len(self.rows)
+        self.rows.extend(rows)
+        if start < self.top + self.visible:
+            self.render()
+        else:
+            self.update_scrollbar()
+
+    def selected_row(self):
+        if self.selected is None or self.selected >= len(self.rows):
+            return None
+        return self.rows[self.selected]
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.rows) - self.visible))
+        if top != self.top:
+            self.top = top
+            self.render()
+
+    def render(self):
+        """Fill the Treeview items with the rows from self.top on."""
+        items = self.tree.get_children()
+        shown = self.rows[self.top:self.top + self.visible]
+        for i, row in enumerate(shown):
+            if i < len(items):
+                self.tree.item(items[i], values=row)
+            else:
+                self.tree.insert("", "end", iid=f"row{i}", values=row)
+        if len(items) > len(shown):
+            self.tree.delete(*items[len(shown):])
+
+        if self.selected is not None and self.top <= self.selected < self.top + len(shown):
+            self.tree.selection_set(f"row{self.selected - self.top}")
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        count = len(self.rows)
+        if count <= self.visible:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.top / count, min(1.0, (self.top + self.visible) / count))
+
+    def on_configure(self, event):
+        # one row less for the heading
+        visible = max(1, event.height // self.row_height - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.top = max(0, min(self.top, len(self.rows) - visible))
+            self.render()
+
+    def on_select(self, event):
+        # an empty selection comes from scrolling the selected row out of view
+        selection = self.tree.selection()
+        if selection:
+            self.selected = self.top + self.tree.index(selection[0])
+
+    def on_scrollbar(self, *args):
+        if args[0] == "moveto":
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == "scroll":
+            step = self.visible if args[2] == "pages" else 1
+            self.scroll_to(self.top + int(args[1]) * step)
+
+    def on_wheel(self, event):
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.top - WHEEL_ROWS)
+        else:
+            self.scroll_to(self.top + WHEEL_ROWS)
+        return "break"
+
+    def move_selection(self, delta):
+        if not self.rows:
+            return "break"
+        current = self.selected if self.selected is not None else self.top - 1
+        self.selected = max(0, min(current + delta, len(self.rows) - 1))
+        if self.selected < self.top:
+            self.top = self.selected
+        elif self.selected >= self.top + self.visible:
+            self.top = self.selected - self.visible + 1
+        self.render()
+        return "break"